@@ -1,91 +1,343 @@
+# Patch the standard library before anything else imports it, so blocking
+# socket I/O such as the OpenAI client's HTTP calls yields to other greenlets
+# instead of stalling every Socket.IO connection on the worker
+from gevent import monkey
+monkey.patch_all()
+
 import os
 import io
+import functools
+import hashlib
+import secrets
+import string
 import tempfile
-from flask import Flask, request, jsonify, send_file
+from collections import OrderedDict
+from contextlib import ExitStack
+from flask import Flask, Blueprint, Request, Response, request, send_file, send_from_directory, stream_with_context
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, disconnect
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import secure_filename
-import traceback
+import logging
 import openai
 from dotenv import load_dotenv
 import pathlib
-from audio_analysis_service import audio_analysis_service
+import ujson
+import orjson
+import numpy as np
+from audio_analysis_service import get_audio_analysis_service
 from socket_vad_service import socket_vad_service
 import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 # Load environment variables from the project root .env file
 project_root = pathlib.Path(__file__).parent.parent
 dotenv_path = project_root / '.env'
 load_dotenv(dotenv_path=dotenv_path)
 
-# Set OpenAI API key from the VITE_ prefixed environment variable
-openai.api_key = os.getenv("VITE_OPENAI_API_KEY")
-if not openai.api_key:
-    print("⚠️ WARNING: VITE_OPENAI_API_KEY not found in environment variables")
+# Log warnings and errors by default; set LOG_LEVEL=DEBUG for request tracing
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "WARNING").upper(),
+    format="%(asctime)s %(levelname)s [%(name)s] %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Read the OpenAI API key once from the VITE_ prefixed environment variable
+OPENAI_API_KEY = os.getenv("VITE_OPENAI_API_KEY")
+if not OPENAI_API_KEY:
+    logger.warning("VITE_OPENAI_API_KEY not found in environment variables")
 else:
-    print(f"✅ Found OpenAI API key: {openai.api_key[:5]}...{openai.api_key[-5:]}")
+    logger.info("Found OpenAI API key: %s...%s", OPENAI_API_KEY[:5], OPENAI_API_KEY[-5:])
+
+# Shared OpenAI client, so the underlying keep-alive connection pool (and its
+# TLS sessions) is reused across requests
+openai_client = openai.OpenAI(
+    api_key=OPENAI_API_KEY,
+    timeout=60.0,
+    max_retries=2
+) if OPENAI_API_KEY else None
+
+# orjson options: encode numpy arrays/scalars and dicts with non-string keys
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson."""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=ORJSON_OPTIONS), mimetype='application/json')
+
+def json_response(obj, status=200):
+    """
+    Encode an object as a JSON response with orjson.
+    
+    Args:
+        obj: JSON-serializable object
+        status: HTTP status code
+        
+    Returns:
+        Flask Response with an application/json body
+    """
+    return Response(orjson.dumps(obj, option=ORJSON_OPTIONS), status=status, mimetype='application/json')
+
+def static_json_response(body: bytes, etag: str):
+    """
+    Serve a precomputed JSON body with caching headers.
+    
+    Args:
+        body: Encoded JSON body
+        etag: Entity tag identifying the body
+        
+    Returns:
+        Flask Response with the body, or an empty 304 if the client's copy
+        matches the ETag
+    """
+    headers = {"ETag": f'"{etag}"', "Cache-Control": STATIC_CACHE_CONTROL}
+    if etag in request.if_none_match:
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype='application/json', headers=headers)
+
+# Uploads up to this size are buffered in memory rather than in a temp file
+UPLOAD_MEMORY_MAX_BYTES = 8 * 1024 * 1024
+
+class AudioUploadRequest(Request):
+    """Request that keeps typical voice recordings off the disk."""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Werkzeug spools anything over 500 KB to a temporary file, which
+        # most recordings exceed; raise the in-memory threshold instead
+        if total_content_length is not None and total_content_length <= UPLOAD_MEMORY_MAX_BYTES:
+            return io.BytesIO()
+        return tempfile.TemporaryFile("rb+")
 
 # Initialize Flask app
 app = Flask(__name__)
+app.request_class = AudioUploadRequest
+app.json = OrjsonProvider(app)
+# Match routes with or without a trailing slash instead of redirecting
+app.url_map.strict_slashes = False
+# Reject request bodies larger than Whisper's 25 MB upload limit before reading them
+app.config['MAX_CONTENT_LENGTH'] = 25 * 1024 * 1024
+
+# Origins allowed to call the API
+CORS_ORIGINS = frozenset([
+    "http://localhost:5173",    # Vite dev server
+    "http://127.0.0.1:5173",    # Alternative localhost
+    "http://localhost:5174",    # Additional Vite dev server port
+    "http://127.0.0.1:5174",    # Alternative additional port
+    "http://localhost:5001",    # Backend
+    "http://127.0.0.1:5001",    # Alternative backend
+    "http://localhost:5002",    # Current backend port
+    "http://127.0.0.1:5002"     # Alternative current backend port
+])
+ALLOWED_ORIGIN_LIST = sorted(CORS_ORIGINS)  # flask-cors and SocketIO expect a list
+CORS_MAX_AGE = 86400  # Seconds browsers may cache a preflight response
 
-# Enable CORS with more specific configuration
+# Enable CORS with more specific configuration. flask-cors adds the headers
+# to every response from a single after_request hook.
 CORS(app, resources={
     r"/*": {
-        "origins": [
-            "http://localhost:5173",    # Vite dev server
-            "http://127.0.0.1:5173",    # Alternative localhost
-            "http://localhost:5174",    # Additional Vite dev server port
-            "http://127.0.0.1:5174",    # Alternative additional port
-            "http://localhost:5001",    # Backend
-            "http://127.0.0.1:5001",    # Alternative backend
-            "http://localhost:5002",    # Current backend port
-            "http://127.0.0.1:5002"     # Alternative current backend port
-        ],
+        "origins": ALLOWED_ORIGIN_LIST,
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"]
+        "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"],
+        "expose_headers": ["Content-Location", "X-Session-Id"],
+        "max_age": CORS_MAX_AGE
     }
 })
 
-# Initialize SocketIO with CORS support for multiple origins
+# Initialize SocketIO with CORS support for multiple origins.
+# gevent-websocket picks up wsaccel for frame (un)masking when it is installed,
+# and ujson's C encoder handles the Socket.IO packet payloads.
 socketio = SocketIO(
     app, 
-    cors_allowed_origins=[
-        "http://localhost:5173",
-        "http://127.0.0.1:5173",
-        "http://localhost:5174",
-        "http://127.0.0.1:5174",
-        "http://localhost:5001",
-        "http://127.0.0.1:5001",
-        "http://localhost:5002",
-        "http://127.0.0.1:5002"
-    ], 
-    async_mode='eventlet'
+    cors_allowed_origins=ALLOWED_ORIGIN_LIST, 
+    async_mode='gevent',
+    json=ujson
 )
 
+@app.errorhandler(Exception)
+def handle_unexpected_error(e):
+    """Report errors from any route as JSON instead of Flask's HTML pages."""
+    # HTTP errors such as 400, 404 and 413 keep their own status code
+    if isinstance(e, HTTPException):
+        if e.code is None or e.code < 400:
+            return e
+        response = e.get_response()
+        response.data = orjson.dumps({"error": e.description})
+        response.content_type = 'application/json'
+        return response
+    logger.exception("Error handling %s %s: %s", request.method, request.path, e)
+    return json_response({"error": str(e)}, 500)
+
 # Global constants
 TEMP_DIR = tempfile.gettempdir()
 AUDIO_SAMPLE_RATE = 24000
+TTS_CHUNK_SIZE = 64 * 1024  # Bytes per chunk when streaming TTS audio
+TTS_MODEL = "tts-1"
+
+# Audio formats /api/tts can return, chosen by the request's Accept header.
+# Raw PCM is 16-bit little-endian mono at AUDIO_SAMPLE_RATE, for clients
+# that feed samples straight into an audio buffer and need no decoding.
+TTS_FORMATS = {
+    "audio/mpeg": ("mp3", "audio/mpeg"),
+    "audio/pcm": ("pcm", f"audio/pcm;rate={AUDIO_SAMPLE_RATE};channels=1"),
+}
+TTS_MIMETYPES = {extension: mimetype for extension, mimetype in TTS_FORMATS.values()}
+
+# Map philosophers to OpenAI voices
+OPENAI_VOICES = {
+    0: "onyx",    # Marcus Aurelius - deep, authoritative male voice
+    1: "echo",    # Seneca - clear, well-articulated voice
+    2: "ash",     # Epictetus - firm, directive voice
+}
+
+# Generated speech is cached on disk keyed by model, voice and text
+TTS_CACHE_DIR = pathlib.Path(TEMP_DIR) / "stoic_tts"
+TTS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+TTS_CACHE_MAX_BYTES = 256 * 1024 * 1024
+TTS_CACHE_PRUNE_INTERVAL = 100  # Check the cache size every N writes
+TTS_CACHE_MAX_AGE = 86400  # Seconds clients may reuse audio fetched from its cache URL
+tts_cache_writes = 0
+
+# Available mentor personalities
+MENTORS = {
+    "marcus": {
+        "name": "Marcus Aurelius",
+        "style": "calm",
+        "description": "Roman Emperor and Stoic philosopher, speaks with quiet strength and wisdom."
+    },
+    "seneca": {
+        "name": "Seneca",
+        "style": "motivational",
+        "description": "Roman Stoic philosopher and statesman, speaks with eloquence and motivation."
+    },
+    "epictetus": {
+        "name": "Epictetus",
+        "style": "firm",
+        "description": "Former slave turned influential Stoic philosopher, speaks bluntly and challenges assumptions."
+    }
+}
+
+# API documentation served from the root path
+API_DOCS = {
+    "name": "Stoic Mentor API",
+    "version": "1.1.0",
+    "description": "API for the Stoic Voice Mentor application",
+    "endpoints": [
+        {"path": "/", "method": "GET", "description": "API documentation"},
+        {"path": "/api/health", "method": "GET", "description": "Health check endpoint"},
+        {"path": "/api/mentors", "method": "GET", "description": "Get available mentor personalities"},
+        {"path": "/api/tts", "method": "POST", "description": "Convert text to speech"},
+        {"path": "/api/tts/cache/<filename>", "method": "GET", "description": "Re-fetch cached speech from the Content-Location returned by /api/tts cache hits"},
+        {"path": "/api/transcribe", "method": "POST", "description": "Transcribe speech to text"},
+        {"path": "/api/gpt", "method": "POST", "description": "Generate mentor response using OpenAI API"},
+        {"path": "/api/gpt/batch", "method": "POST", "description": "Submit several mentor prompts as one OpenAI Batch API job"},
+        {"path": "/api/gpt/batch/<batch_id>", "method": "GET", "description": "Get a batch job's status and, once completed, its responses and per-request errors"},
+        {"path": "/api/audio-analysis", "method": "POST", "description": "Analyze audio level for speech detection using adaptive thresholding"},
+        {"path": "/api/audio-analysis/calibrate", "method": "POST", "description": "Force recalibration of the audio analysis service"},
+        {"path": "/api/audio-analysis/threshold", "method": "GET", "description": "Get the current threshold value from audio analysis service"},
+        {"path": "/api/audio-analysis/config", "method": "PUT", "description": "Update the audio analysis service configuration"},
+        {"path": "/api/audio-analysis/debug", "method": "GET", "description": "Get debug state from audio analysis service"}
+    ],
+    "websocket_endpoints": [
+        {"event": "connect", "description": "Establish WebSocket connection"},
+        {"event": "init_vad", "description": "Initialize or retrieve a VAD session"},
+        {"event": "process_audio", "description": "Stream audio data for processing"},
+        {"event": "process_audio_batch", "description": "Process a batch of precomputed audio levels"},
+        {"event": "update_vad_config", "description": "Update VAD configuration"},
+        {"event": "force_recalibration", "description": "Force recalibration of VAD system"},
+        {"event": "get_debug_state", "description": "Get debug state of the VAD session"}
+    ]
+}
+
+# Static JSON payloads, serialized once at import
+MENTORS_JSON = orjson.dumps(MENTORS)
+API_DOCS_JSON = orjson.dumps(API_DOCS)
+HEALTH_JSON = orjson.dumps({"status": "ok", "model": "openai"})
+MENTORS_ETAG = hashlib.blake2b(MENTORS_JSON, digest_size=16).hexdigest()
+API_DOCS_ETAG = hashlib.blake2b(API_DOCS_JSON, digest_size=16).hexdigest()
+STATIC_CACHE_CONTROL = "public, max-age=3600"
+
+# Mentor system prompts, fully assembled once at import
+BASE_PROMPT = "You are a Stoic philosopher and mentor, providing guidance based on Stoic principles. "
+
+MENTOR_PROMPTS = {
+    "marcus": BASE_PROMPT + """
+        You are Marcus Aurelius, the Roman Emperor and Stoic philosopher. Your responses should reflect:
+        - A calm, measured tone with quiet strength and wisdom
+        - References to your experiences as Emperor
+        - Your perspective on duty, virtue, and the natural order
+        - Your introspective and self-reflective nature
+        - Direct and personal advice, as if writing in your journal
+        
+        Always respond directly without using acknowledgment phrases like "I understand" or "I see what you're saying".
+        Never acknowledge the format of the question. Start your response immediately with substance.
+        """,
+    "seneca": BASE_PROMPT + """
+        You are Seneca, the Roman Stoic philosopher, statesman, and playwright. Your responses should reflect:
+        - An eloquent and persuasive tone
+        - Your practical approach to Stoicism
+        - References to your experiences in Roman politics and as Nero's tutor
+        - Your thoughts on wealth, time, and mortality
+        - A motivational and encouraging style
+        
+        Always respond directly without using acknowledgment phrases like "I understand" or "I see what you're saying".
+        Never acknowledge the format of the question. Start your response immediately with substance.
+        """,
+    "epictetus": BASE_PROMPT + """
+        You are Epictetus, the former slave who became a respected Stoic philosopher. Your responses should reflect:
+        - A firm, direct, and sometimes blunt tone
+        - Your focus on personal freedom despite external circumstances
+        - References to your humble origins and physical disability
+        - Your emphasis on what is within our control versus what is not
+        - A challenging teaching style that questions assumptions
+        
+        Always respond directly without using acknowledgment phrases like "I understand" or "I see what you're saying".
+        Never acknowledge the format of the question. Start your response immediately with substance.
+        """
+}
+
+# Substrings of a normalized mentor name that select each prompt, in match order
+MENTOR_ALIASES = {
+    "marcus": ("marcus", "aurelius"),
+    "seneca": ("seneca",),
+    "epictetus": ("epictetus",)
+}
+
+# Exact lookup for the mentor keys and display names clients send, so the
+# common case is a single dict hit instead of a substring scan
+MENTOR_PROMPTS_BY_NAME = {
+    **{key: MENTOR_PROMPTS[key] for key in MENTOR_PROMPTS},
+    **{mentor["name"].lower(): MENTOR_PROMPTS[key] for key, mentor in MENTORS.items()}
+}
 
 # Socket event handlers
 @socketio.on('connect')
 def handle_connect():
     """Handle new WebSocket connections."""
-    print(f"[SocketIO] New client connected: {request.sid}")
-    print(f"[SocketIO] Connection details: Origin: {request.origin}, Transport: {request.environ.get('HTTP_SEC_WEBSOCKET_KEY', 'N/A')}")
-    print(f"[SocketIO] Headers: {request.headers}")
+    logger.debug("[SocketIO] New client connected: %s", request.sid)
+    logger.debug("[SocketIO] Connection details: Origin: %s, Transport: %s", request.origin, request.environ.get('HTTP_SEC_WEBSOCKET_KEY', 'N/A'))
+    logger.debug("[SocketIO] Headers: %s", request.headers)
     emit('connected', {'status': 'connected', 'sid': request.sid})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnections."""
-    print(f"[SocketIO] Client disconnected: {request.sid}")
+    logger.debug("[SocketIO] Client disconnected: %s", request.sid)
     # Clean up any session if it exists
     session_id = request.args.get('session_id')
     if session_id:
         socket_vad_service.remove_session(session_id)
-        print(f"[SocketIO] Removed session: {session_id}")
+        logger.debug("[SocketIO] Removed session: %s", session_id)
     else:
-        print(f"[SocketIO] No session ID found for cleanup")
+        logger.debug("[SocketIO] No session ID found for cleanup")
 
 @socketio.on('init_vad')
 def handle_init_vad(data):
@@ -100,630 +352,1002 @@ def handle_init_vad(data):
         # Return session info
         emit('vad_initialized', {
             'session_id': session_id,
-            'noise_profile': session.get_noise_profile(),
+            'noise_profile': session.get_noise_profile(include_samples=True),
             'config': session.config
         })
         
-        print(f"[SocketIO] VAD session initialized: {session_id}")
+        logger.debug("[SocketIO] VAD session initialized: %s", session_id)
         
     except Exception as e:
-        print(f"[SocketIO] Error initializing VAD: {e}")
-        print(traceback.format_exc())
+        logger.exception("[SocketIO] Error initializing VAD: %s", e)
         emit('error', {'message': f"Failed to initialize VAD: {str(e)}"})
 
+def with_session(action: str, create: bool = False):
+    """
+    Decorator for Socket.IO handlers that operate on an existing VAD session.
+    
+    Resolves the session named by the event's 'session_id' once and calls the
+    handler as handler(session_id, session, data). Missing or unknown sessions
+    and handler exceptions are reported to the client with an 'error' event.
+    
+    Args:
+        action: Description of the handler's action used in error messages
+        create: Create the session if it does not exist yet
+        
+    Returns:
+        Decorator wrapping the handler
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(data):
+            try:
+                session_id = data.get('session_id')
+                if not session_id:
+                    emit('error', {'message': "Missing session_id"})
+                    return
+                
+                if create:
+                    session_id, session = socket_vad_service.get_or_create_session(session_id)
+                else:
+                    session = socket_vad_service.get_session(session_id)
+                    if not session:
+                        emit('error', {'message': f"Session {session_id} not found"})
+                        return
+                
+                handler(session_id, session, data)
+                
+            except Exception as e:
+                logger.exception("[SocketIO] Failed to %s: %s", action, e)
+                emit('error', {'message': f"Failed to {action}: {str(e)}"})
+        return wrapper
+    return decorator
+
 @socketio.on('process_audio')
-def handle_process_audio(data):
+@with_session("process audio", create=True)
+def handle_process_audio(session_id, session, data):
     """Process audio data for VAD."""
-    try:
-        # Get session ID and audio data
-        session_id = data.get('session_id')
-        audio_data = data.get('audio')
-        
-        if not session_id or not audio_data:
-            emit('error', {'message': "Missing session_id or audio data"})
-            return
-        
-        # Process the audio
-        result = socket_vad_service.process_audio(session_id, audio_data)
-        
-        # Check for events that should trigger specific responses
-        if 'event' in result:
-            emit(result['event'], result)
-        else:
-            emit('vad_result', result)
-            
-    except Exception as e:
-        print(f"[SocketIO] Error processing audio: {e}")
-        print(traceback.format_exc())
-        emit('error', {'message': f"Failed to process audio: {str(e)}"})
+    audio_data = data.get('audio')
+    if not audio_data:
+        emit('error', {'message': "Missing audio data"})
+        return
+    
+    # Process the audio
+    result = session.process_audio_chunk(audio_data)
+    
+    # Check for events that should trigger specific responses
+    if 'event' in result:
+        emit(result['event'], result)
+    else:
+        emit('vad_result', result)
+
+@socketio.on('process_audio_batch')
+@with_session("process audio batch", create=True)
+def handle_process_audio_batch(session_id, session, data):
+    """Process a batch of precomputed audio levels for VAD."""
+    levels = data.get('levels')
+    timestamps = data.get('timestamps')
+    
+    if not levels:
+        emit('error', {'message': "Missing levels"})
+        return
+    
+    if timestamps is not None and len(timestamps) != len(levels):
+        emit('error', {'message': "Length of timestamps does not match levels"})
+        return
+    
+    # Convert the batch once instead of per sample
+    levels = np.asarray(levels, dtype=np.float32)
+    if timestamps is not None:
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+    
+    # Process the batch
+    result = session.process_level_batch(levels, timestamps)
+    emit(result['event'], result)
 
 @socketio.on('update_vad_config')
-def handle_update_vad_config(data):
+@with_session("update VAD config")
+def handle_update_vad_config(session_id, session, data):
     """Update the VAD configuration for a session."""
-    try:
-        # Get session ID and config
-        session_id = data.get('session_id')
-        config = data.get('config')
-        
-        if not session_id or not config:
-            emit('error', {'message': "Missing session_id or config"})
-            return
-        
-        # Get the session
-        session = socket_vad_service.get_session(session_id)
-        if not session:
-            emit('error', {'message': f"Session {session_id} not found"})
-            return
-        
-        # Update the session config
-        session.update_vad_config(config)
-        
-        emit('config_updated', {
-            'session_id': session_id,
-            'config': session.config
-        })
-        
-    except Exception as e:
-        print(f"[SocketIO] Error updating VAD config: {e}")
-        print(traceback.format_exc())
-        emit('error', {'message': f"Failed to update VAD config: {str(e)}"})
+    config = data.get('config')
+    if not config:
+        emit('error', {'message': "Missing config"})
+        return
+    
+    # Update the session config
+    session.update_vad_config(config)
+    
+    emit('config_updated', {
+        'session_id': session_id,
+        'config': session.config
+    })
 
 @socketio.on('force_recalibration')
-def handle_force_recalibration(data):
+@with_session("force recalibration")
+def handle_force_recalibration(session_id, session, data):
     """Force recalibration of the VAD system."""
-    try:
-        # Get session ID
-        session_id = data.get('session_id')
-        
-        if not session_id:
-            emit('error', {'message': "Missing session_id"})
-            return
-        
-        # Get the session
-        session = socket_vad_service.get_session(session_id)
-        if not session:
-            emit('error', {'message': f"Session {session_id} not found"})
-            return
-        
-        # Force recalibration
-        session.force_recalibration()
-        
-        emit('recalibration_started', {
-            'session_id': session_id,
-            'timestamp': int(time.time() * 1000)
-        })
-        
-    except Exception as e:
-        print(f"[SocketIO] Error forcing recalibration: {e}")
-        print(traceback.format_exc())
-        emit('error', {'message': f"Failed to force recalibration: {str(e)}"})
+    session.force_recalibration()
+    
+    emit('recalibration_started', {
+        'session_id': session_id,
+        'timestamp': int(time.time() * 1000)
+    })
 
 @socketio.on('get_debug_state')
-def handle_get_debug_state(data):
+@with_session("get debug state")
+def handle_get_debug_state(session_id, session, data):
     """Get the debug state for a session."""
-    try:
-        # Get session ID
-        session_id = data.get('session_id')
-        
-        if not session_id:
-            emit('error', {'message': "Missing session_id"})
-            return
-        
-        # Get the session
-        session = socket_vad_service.get_session(session_id)
-        if not session:
-            emit('error', {'message': f"Session {session_id} not found"})
-            return
-        
-        # Get debug state
-        debug_state = session.get_debug_state()
-        
-        emit('debug_state', debug_state)
-        
-    except Exception as e:
-        print(f"[SocketIO] Error getting debug state: {e}")
-        print(traceback.format_exc())
-        emit('error', {'message': f"Failed to get debug state: {str(e)}"})
+    emit('debug_state', session.get_debug_state())
 
-@app.route('/', methods=['GET'])
+@app.get('/')
 def root():
     """Provide API documentation for the root path."""
-    api_docs = {
-        "name": "Stoic Mentor API",
-        "version": "1.1.0",
-        "description": "API for the Stoic Voice Mentor application",
-        "endpoints": [
-            {"path": "/", "method": "GET", "description": "API documentation"},
-            {"path": "/api/health", "method": "GET", "description": "Health check endpoint"},
-            {"path": "/api/mentors", "method": "GET", "description": "Get available mentor personalities"},
-            {"path": "/api/tts", "method": "POST", "description": "Convert text to speech"},
-            {"path": "/api/transcribe", "method": "POST", "description": "Transcribe speech to text"},
-            {"path": "/api/gpt", "method": "POST", "description": "Generate mentor response using OpenAI API"},
-            {"path": "/api/audio-analysis", "method": "POST", "description": "Analyze audio level for speech detection using adaptive thresholding"},
-            {"path": "/api/audio-analysis/calibrate", "method": "POST", "description": "Force recalibration of the audio analysis service"},
-            {"path": "/api/audio-analysis/threshold", "method": "GET", "description": "Get the current threshold value from audio analysis service"},
-            {"path": "/api/audio-analysis/config", "method": "PUT", "description": "Update the audio analysis service configuration"},
-            {"path": "/api/audio-analysis/debug", "method": "GET", "description": "Get debug state from audio analysis service"}
-        ],
-        "websocket_endpoints": [
-            {"event": "connect", "description": "Establish WebSocket connection"},
-            {"event": "init_vad", "description": "Initialize or retrieve a VAD session"},
-            {"event": "process_audio", "description": "Stream audio data for processing"},
-            {"event": "update_vad_config", "description": "Update VAD configuration"},
-            {"event": "force_recalibration", "description": "Force recalibration of VAD system"},
-            {"event": "get_debug_state", "description": "Get debug state of the VAD session"}
-        ]
-    }
-    return jsonify(api_docs)
+    return static_json_response(API_DOCS_JSON, API_DOCS_ETAG)
 
-@app.route('/api/health', methods=['GET'])
+@app.get('/api/health')
 def health_check():
     """Simple health check endpoint to verify the API is running."""
-    return jsonify({"status": "ok", "model": "openai"})
+    return Response(HEALTH_JSON, mimetype='application/json')
 
-@app.route('/api/mentors', methods=['GET'])
+@app.get('/api/mentors')
 def get_mentors():
     """Returns the available mentor personalities."""
-    mentors = {
-        "marcus": {
-            "name": "Marcus Aurelius",
-            "style": "calm",
-            "description": "Roman Emperor and Stoic philosopher, speaks with quiet strength and wisdom."
-        },
-        "seneca": {
-            "name": "Seneca",
-            "style": "motivational",
-            "description": "Roman Stoic philosopher and statesman, speaks with eloquence and motivation."
-        },
-        "epictetus": {
-            "name": "Epictetus",
-            "style": "firm",
-            "description": "Former slave turned influential Stoic philosopher, speaks bluntly and challenges assumptions."
-        }
-    }
-    return jsonify(mentors)
+    return static_json_response(MENTORS_JSON, MENTORS_ETAG)
+
+def prune_tts_cache() -> None:
+    """Delete the least recently used cached TTS files until the cache fits its size cap."""
+    entries = []
+    for path in TTS_CACHE_DIR.iterdir():
+        if path.suffix == ".tmp":
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+        if total_size <= TTS_CACHE_MAX_BYTES:
+            break
+        path.unlink(missing_ok=True)
+        total_size -= size
 
-@app.route('/api/tts', methods=['POST'])
+def cache_tts_stream(chunks, cache_path: pathlib.Path):
+    """
+    Pass TTS audio chunks through while writing them to the disk cache.
+    
+    The audio is written to a temporary file that is atomically renamed into
+    place only once the stream has completed, so partial responses are never
+    served from the cache.
+    
+    Args:
+        chunks: Iterator of audio byte chunks
+        cache_path: Final cache file path
+        
+    Yields:
+        The audio chunks, unchanged
+    """
+    global tts_cache_writes
+    
+    fd, tmp_name = tempfile.mkstemp(dir=TTS_CACHE_DIR, suffix=".tmp")
+    tmp_path = pathlib.Path(tmp_name)
+    try:
+        with os.fdopen(fd, 'wb') as cache_file:
+            for chunk in chunks:
+                cache_file.write(chunk)
+                yield chunk
+        os.replace(tmp_path, cache_path)
+        tmp_path = None
+        
+        tts_cache_writes += 1
+        if tts_cache_writes % TTS_CACHE_PRUNE_INTERVAL == 0:
+            prune_tts_cache()
+    finally:
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+
+@app.post('/api/tts')
 def text_to_speech():
     """Creates an audio file for text-to-speech using OpenAI's API."""
+    # Get JSON data from request
+    data = request.json
+    if not data or 'text' not in data:
+        return json_response({"error": "No text provided"}, 400)
+        
+    text = data.get('text')
+    speaker_id = data.get('speaker', 0)  # Default to first speaker if not specified
+    
+    logger.debug("[TTS] Generating audio for text: %s", text)
+    logger.debug("[TTS] Requested speaker_id: %s", speaker_id)
+    
+    # Get the voice for the specified speaker
+    voice = OPENAI_VOICES.get(speaker_id, "onyx")  # Default to onyx if speaker_id not found
+    logger.debug("[TTS] Using OpenAI TTS with voice: %s", voice)
+    
+    # MP3 unless the client explicitly prefers raw PCM
+    accepted = request.accept_mimetypes.best_match(TTS_FORMATS, default="audio/mpeg")
+    response_format, mimetype = TTS_FORMATS[accepted]
+    
+    # Serve previously generated audio from the disk cache
+    cache_key = hashlib.blake2b(f"{TTS_MODEL}|{voice}|{text}".encode('utf-8'), digest_size=16).hexdigest()
+    cache_path = TTS_CACHE_DIR / f"{cache_key}.{response_format}"
+    if cache_path.exists():
+        logger.debug("[TTS] Cache hit for %s", cache_key)
+        os.utime(cache_path)  # Mark as recently used for pruning
+        response = send_file(
+            cache_path,
+            mimetype=mimetype,
+            as_attachment=True,
+            download_name=f"speech_{speaker_id}.{response_format}",
+            conditional=True
+        )
+        response.headers["Content-Location"] = f"/api/tts/cache/{cache_path.name}"
+        return response
+    
+    # Check for the OpenAI client
+    if openai_client is None:
+        return json_response({"error": "OpenAI API key not found in environment"}, 500)
+    
     try:
-        # Get JSON data from request
-        data = request.json
-        if not data or 'text' not in data:
-            return jsonify({"error": "No text provided"}), 400
+        # Generate speech using OpenAI's TTS API. The streaming response
+        # hands back the HTTP body as it arrives instead of reading it all
+        # first, and stays open until the client has received the audio.
+        # The with block closes it if anything fails before the response is
+        # built; after that the response closes it.
+        with ExitStack() as upstream:
+            speech = upstream.enter_context(openai_client.audio.speech.with_streaming_response.create(
+                model=TTS_MODEL,
+                voice=voice,
+                input=text,
+                response_format=response_format
+            ))
             
-        text = data.get('text')
-        speaker_id = data.get('speaker', 0)  # Default to first speaker if not specified
+            logger.debug("[TTS] Successfully generated audio with OpenAI TTS")
+            
+            # Stream the audio chunks straight through to the client,
+            # saving a copy in the cache on the way
+            response = Response(
+                stream_with_context(cache_tts_stream(speech.iter_bytes(chunk_size=TTS_CHUNK_SIZE), cache_path)),
+                mimetype=mimetype,
+                headers={
+                    "Content-Disposition": f'attachment; filename="speech_{speaker_id}.{response_format}"'
+                }
+            )
+            response.call_on_close(upstream.pop_all().close)
+        return response
+    except Exception as openai_error:
+        logger.exception("[TTS] OpenAI TTS failed: %s", openai_error)
+        return json_response({"error": f"Failed to generate speech with OpenAI: {str(openai_error)}"}, 500)
+
+@app.get('/api/tts/cache/<filename>')
+def cached_speech(filename):
+    """
+    Serves previously generated speech from the TTS disk cache.
+    
+    /api/tts returns this URL in its Content-Location header once the audio is
+    cached; freshly generated speech is still streaming into the cache, so
+    that response has no Content-Location. Unlike the POST, a GET can be
+    revalidated, so repeat clients get a 304 via If-None-Match or
+    If-Modified-Since instead of downloading the audio again.
+    """
+    mimetype = TTS_MIMETYPES.get(pathlib.PurePath(filename).suffix.lstrip("."))
+    if mimetype is None:
+        return json_response({"error": "Unknown audio format"}, 404)
+    
+    return send_from_directory(
+        TTS_CACHE_DIR,
+        filename,
+        mimetype=mimetype,
+        conditional=True,
+        max_age=TTS_CACHE_MAX_AGE
+    )
+
+@app.post('/api/transcribe')
+def transcribe():
+    """Transcribes audio to text."""
+    # Check if file is in the request
+    if 'file' not in request.files:
+        return json_response({"error": "No file uploaded"}, 400)
         
-        print(f"[TTS] Generating audio for text: {text}")
-        print(f"[TTS] Requested speaker_id: {speaker_id}")
+    file = request.files['file']
+    if file.filename == '':
+        return json_response({"error": "No file selected"}, 400)
         
-        # Map philosophers to OpenAI voices
-        openai_voices = {
-            0: "onyx",    # Marcus Aurelius - deep, authoritative male voice
-            1: "echo",    # Seneca - clear, well-articulated voice
-            2: "ash",     # Epictetus - firm, directive voice
-        }
+    # Check for the OpenAI client
+    if openai_client is None:
+        return json_response({"error": "OpenAI API key not found in environment"}, 500)
+    
+    # Hand Werkzeug's upload stream straight to the SDK instead of copying
+    # it; the audio format is inferred from the filename
+    audio_file = (
+        secure_filename(file.filename) or 'audio.webm',
+        file.stream,
+        file.mimetype or 'application/octet-stream'
+    )
+    
+    try:
+        # Transcribe using OpenAI's Whisper API
+        transcript = openai_client.audio.transcriptions.create(
+            model="whisper-1",
+            file=audio_file
+        )
         
-        # Check for API key
-        api_key = os.getenv("VITE_OPENAI_API_KEY")
-        if not api_key:
-            return jsonify({"error": "OpenAI API key not found in environment"}), 500
+        return json_response({"text": transcript.text})
+    except Exception as openai_error:
+        logger.exception("[TRANSCRIBE] OpenAI Whisper failed: %s", openai_error)
+        return json_response({"error": f"Failed to transcribe with OpenAI: {str(openai_error)}"}, 500)
+
+# Chat model used for mentor replies
+GPT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+# Upper bound on reply length, which keeps tail latency in check
+GPT_MAX_TOKENS = int(os.getenv("GPT_MAX_TOKENS", "400"))
+
+# Separator between the speaker and the text in conversation history entries
+HISTORY_SEPARATOR = ": "
+
+# Bounds on what a GPT request may send upstream
+GPT_MAX_BODY_BYTES = 1024 * 1024  # Largest accepted /api/gpt request body
+GPT_MAX_HISTORY = 20  # Most recent history messages kept
+GPT_MAX_CHARS = 8000  # Characters of non-system message content kept
+
+def trim_gpt_messages(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    Drop the oldest non-system messages until the conversation fits the limits.
+    
+    System messages and the final message are always kept.
+    
+    Args:
+        messages: Chat messages in conversation order
         
-        # Set up OpenAI client
-        openai.api_key = api_key
+    Returns:
+        The messages that fit within GPT_MAX_HISTORY and GPT_MAX_CHARS
+    """
+    if not messages:
+        return messages
+    
+    # Walk back from the newest message, keeping whatever fits the budget
+    *earlier, last = messages
+    kept_count = 0
+    chars = len(str(last.get('content') or ''))
+    keep = [True] * len(earlier)
+    for i in range(len(earlier) - 1, -1, -1):
+        if earlier[i].get('role') == 'system':
+            continue
+        chars += len(str(earlier[i].get('content') or ''))
+        if kept_count >= GPT_MAX_HISTORY or chars > GPT_MAX_CHARS:
+            keep[i] = False
+        else:
+            kept_count += 1
+    
+    return [message for message, kept in zip(earlier, keep) if kept] + [last]
+
+# LRU cache of GPT replies for deterministic (temperature 0) or explicitly
+# cacheable requests, keyed by a digest of the messages (with the new user turn
+# normalized) and temperature.
+# Entries expire after GPT_CACHE_TTL seconds so model or prompt changes show up.
+GPT_CACHE_SIZE = 512
+GPT_CACHE_TTL = 1800
+gpt_response_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+def normalize_cache_text(content: Any) -> Any:
+    """
+    Normalize message content for the GPT cache key.
+    
+    Case, runs of whitespace and surrounding punctuation are ignored, so
+    "How are you?" and "how are you" share a cache entry.
+    
+    Args:
+        content: Message content; non-string content is returned unchanged
         
-        # Get the voice for the specified speaker
-        voice = openai_voices.get(speaker_id, "onyx")  # Default to onyx if speaker_id not found
-        print(f"[TTS] Using OpenAI TTS with voice: {voice}")
+    Returns:
+        Normalized content
+    """
+    if not isinstance(content, str):
+        return content
+    return " ".join(content.lower().split()).strip(string.punctuation)
+
+def gpt_prompt_cache_key(messages: List[Dict[str, str]]) -> Optional[str]:
+    """
+    Build the OpenAI prompt_cache_key for a request.
+    
+    Requests sharing a system prompt are routed together, which keeps
+    OpenAI's automatic prompt-prefix cache warm for each mentor.
+    
+    Args:
+        messages: Chat messages sent to the model
         
-        try:
-            # Generate speech using OpenAI's TTS API
-            response = openai.audio.speech.create(
-                model="tts-1",
-                voice=voice,
-                input=text
-            )
-            
-            # Get the audio content
-            buffer = io.BytesIO()
-            for chunk in response.iter_bytes(chunk_size=4096):
-                buffer.write(chunk)
-            buffer.seek(0)
-            
-            print(f"[TTS] Successfully generated audio with OpenAI TTS")
-            
-            # Return audio file
-            return send_file(
-                buffer,
-                mimetype="audio/mp3",
-                as_attachment=True,
-                download_name=f"speech_{speaker_id}.mp3"
-            )
-        except Exception as openai_error:
-            print(f"[TTS] OpenAI TTS failed: {openai_error}")
-            print(traceback.format_exc())
-            return jsonify({"error": f"Failed to generate speech with OpenAI: {str(openai_error)}"}), 500
+    Returns:
+        Hex digest of the system prompt, or None if there is none
+    """
+    if not messages or messages[0].get('role') != 'system':
+        return None
+    return hashlib.blake2b(str(messages[0].get('content')).encode('utf-8'), digest_size=8).hexdigest()
+
+def gpt_cache_key(messages: List[Dict[str, str]], temperature: float) -> str:
+    """
+    Build the GPT cache key for a request.
+    
+    Only the final user message is normalized; the rest of the conversation
+    is hashed verbatim, so replies are only shared by identical histories.
+    
+    Args:
+        messages: Chat messages sent to the model
+        temperature: Sampling temperature
         
-    except Exception as e:
-        print(f"[TTS] Error in text-to-speech endpoint: {e}")
-        print(traceback.format_exc())
-        return jsonify({"error": f"Failed to generate speech: {str(e)}"}), 500
+    Returns:
+        Hex digest identifying the request
+    """
+    key_messages = [[m.get('role'), m.get('content')] for m in messages]
+    if key_messages and key_messages[-1][0] == 'user':
+        key_messages[-1][1] = normalize_cache_text(key_messages[-1][1])
+    return hashlib.blake2b(orjson.dumps([key_messages, temperature]), digest_size=16).hexdigest()
 
-@app.route('/api/transcribe', methods=['POST'])
-def transcribe():
-    """Transcribes audio to text."""
-    try:
-        # Check if file is in the request
-        if 'file' not in request.files:
-            return jsonify({"error": "No file uploaded"}), 400
-            
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({"error": "No file selected"}), 400
-            
-        # Save the file temporarily
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join(TEMP_DIR, filename)
-        file.save(temp_path)
+# Server-side conversation history, so only the new turn travels with each
+# request. Session IDs are random tokens issued by the server and returned in
+# the X-Session-Id header; least recently used sessions are dropped first
+GPT_SESSION_LIMIT = 1024
+GPT_SESSION_HEADER = "X-Session-Id"
+gpt_sessions: "OrderedDict[str, List[Dict[str, str]]]" = OrderedDict()
+
+def gpt_session_id(data: Dict[str, Any]) -> Optional[str]:
+    """
+    Get the server-side history session of a text/mentor GPT request.
+    
+    A request with "startSession": true is issued a new session; later
+    requests send that ID back as 'sessionId'. IDs the server did not issue
+    are rejected, so a client can only reach its own history.
+    
+    Args:
+        data: Request payload
         
-        # Check for OpenAI API key
-        api_key = os.getenv("VITE_OPENAI_API_KEY")
-        if not api_key:
-            return jsonify({"error": "OpenAI API key not found in environment"}), 500
+    Returns:
+        The session ID, or None if the request does not use one
         
-        # Set up OpenAI client
-        openai.api_key = api_key
+    Raises:
+        ValueError: If 'sessionId' is not a live server-issued session
+    """
+    if 'messages' in data:
+        return None
+    
+    session_id = data.get('sessionId')
+    if session_id is not None:
+        if not isinstance(session_id, str) or session_id not in gpt_sessions:
+            raise ValueError("Unknown or expired 'sessionId'; send \"startSession\": true to start a new session")
+        gpt_sessions.move_to_end(session_id)
+        return session_id
+    
+    if not data.get('startSession'):
+        return None
+    
+    session_id = secrets.token_urlsafe(16)
+    gpt_sessions[session_id] = []
+    if len(gpt_sessions) > GPT_SESSION_LIMIT:
+        gpt_sessions.popitem(last=False)
+    return session_id
+
+def record_gpt_turn(session_id: str, user_text: str, reply: str) -> None:
+    """
+    Append a completed exchange to a server-side history session.
+    
+    Args:
+        session_id: Session to record the exchange in
+        user_text: The user's message
+        reply: The mentor's reply
+    """
+    history = gpt_sessions.pop(session_id, [])
+    history.append({"role": "user", "content": user_text})
+    history.append({"role": "assistant", "content": reply})
+    
+    # Keep a sliding window of the most recent messages
+    gpt_sessions[session_id] = history[-GPT_MAX_HISTORY:]
+    if len(gpt_sessions) > GPT_SESSION_LIMIT:
+        gpt_sessions.popitem(last=False)
+
+def with_gpt_session(response: Response, session_id: Optional[str]) -> Response:
+    """Return the server-side history session ID, if any, with a GPT reply."""
+    if session_id is not None:
+        response.headers[GPT_SESSION_HEADER] = session_id
+    return response
+
+def build_gpt_messages(data: Dict[str, Any], session_id: Optional[str] = None) -> Optional[List[Dict[str, str]]]:
+    """
+    Build the chat messages for a GPT request.
+    
+    Supports both request formats: a direct 'messages' array, or 'text' and
+    'mentor' with an optional 'conversationHistory'. A session replaces
+    'conversationHistory' with the history kept on the server.
+    
+    Args:
+        data: Request payload
+        session_id: Server-side history session from gpt_session_id, if any
         
-        try:
-            # Transcribe using OpenAI's Whisper API
-            with open(temp_path, "rb") as audio_file:
-                transcript = openai.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file
-                )
-            
-            # Cleanup
-            os.remove(temp_path)
+    Returns:
+        List of chat messages, or None if the required fields are missing
+        
+    Raises:
+        ValueError: If 'messages' or 'conversationHistory' is malformed
+    """
+    if 'messages' in data:
+        messages = data.get('messages')
+        if not isinstance(messages, list) or not messages or not all(
+            isinstance(message, dict)
+            and isinstance(message.get('role'), str)
+            and isinstance(message.get('content'), str)
+            for message in messages
+        ):
+            raise ValueError("'messages' must be a non-empty list of objects with string 'role' and 'content'")
+        logger.debug("[GPT] Using messages format, mentor is: %s", data.get('mentor', 'Marcus'))
+        return trim_gpt_messages(messages)
+    
+    if 'text' not in data or 'mentor' not in data:
+        return None
+    
+    # Convert from legacy format (text + mentor) to messages format
+    text = data.get('text')
+    mentor = data.get('mentor', 'Marcus')
+    logger.debug("[GPT] Using text/mentor format, mentor is: %s, type: %s", mentor, type(mentor))
+    
+    # Create message array with system prompt and user message
+    system_content = create_system_prompt(mentor)
+    
+    if session_id is not None:
+        return trim_gpt_messages([
+            {"role": "system", "content": system_content},
+            *gpt_sessions.get(session_id, ()),
+            {"role": "user", "content": text}
+        ])
+    
+    # The system prompt and history come first and the new turn last, so
+    # follow-up turns share a stable prefix for OpenAI's prompt caching
+    messages = [{"role": "system", "content": system_content}]
+    
+    # Add conversation history if available
+    history = data.get('conversationHistory')
+    if history:
+        if not isinstance(history, list) or not all(isinstance(message, str) for message in history):
+            raise ValueError("'conversationHistory' must be a list of strings")
+        logger.debug("[GPT] Processing conversation history, %s messages", len(history))
+        
+        # Process each message in the conversation history
+        for i, message in enumerate(history):
+            # Split the message into speaker and content if it contains ": "
+            speaker, sep, content = message.partition(HISTORY_SEPARATOR)
+            if sep:
+                # Any non-user speaker is treated as the current mentor
+                role = "user" if speaker.lower() == "user" else "assistant"
+            else:
+                # If there's no speaker prefix, alternate based on position
+                role = "assistant" if i % 2 == 1 else "user"
+                content = message
             
-            return jsonify({"text": transcript.text})
-        except Exception as openai_error:
-            print(f"[TRANSCRIBE] OpenAI Whisper failed: {openai_error}")
-            print(traceback.format_exc())
-            # Cleanup
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            return jsonify({"error": f"Failed to transcribe with OpenAI: {str(openai_error)}"}), 500
+            messages.append({"role": role, "content": content})
+        
+    messages.append({"role": "user", "content": text})
+    
+    # Keep only the most recent history that fits the size limits
+    messages = trim_gpt_messages(messages)
+    logger.debug("[GPT] Final message count after processing history: %s", len(messages))
+    return messages
+
+# Terminating event of a streamed GPT reply
+SSE_DONE = b"data: [DONE]\n\n"
+
+def sse_event(payload: Dict[str, Any]) -> bytes:
+    """Encode a payload as a Server-Sent Events data message."""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+def sse_response(events) -> Response:
+    """
+    Create a streaming Server-Sent Events response.
+    
+    Args:
+        events: Iterator of encoded SSE messages
+        
+    Returns:
+        Flask Response that streams the events as they are produced
+    """
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def get_cached_gpt_response(cache_key: str) -> Optional[str]:
+    """Look up an unexpired GPT reply in the LRU cache, marking it recently used."""
+    entry = gpt_response_cache.get(cache_key)
+    if entry is None:
+        return None
+    expires_at, text = entry
+    if expires_at <= time.monotonic():
+        del gpt_response_cache[cache_key]
+        return None
+    gpt_response_cache.move_to_end(cache_key)
+    return text
+
+def cache_gpt_response(cache_key: str, text: str) -> None:
+    """Store a GPT reply in the LRU cache, evicting the oldest entry when full."""
+    gpt_response_cache[cache_key] = (time.monotonic() + GPT_CACHE_TTL, text)
+    gpt_response_cache.move_to_end(cache_key)
+    if len(gpt_response_cache) > GPT_CACHE_SIZE:
+        gpt_response_cache.popitem(last=False)
+
+def complete_gpt_reply(cache_key: Optional[str], session_id: Optional[str],
+                       user_text: Any, text: str) -> None:
+    """
+    Store a finished GPT reply in the cache and the history session, if any.
+    
+    Args:
+        cache_key: Cache key to store the reply under, if cacheable
+        session_id: Server-side history session, if the request uses one
+        user_text: The user's message
+        text: The full reply
+    """
+    if cache_key is not None:
+        cache_gpt_response(cache_key, text)
+    if session_id is not None:
+        record_gpt_turn(session_id, user_text, text)
+
+def stream_gpt_reply(completion, on_complete: Optional[Callable[[str], None]] = None):
+    """
+    Relay a streamed chat completion as Server-Sent Events.
+    
+    Each text delta is sent as {"text": delta} as soon as it arrives, followed
+    by a final [DONE] message. Errors after the stream has started are sent as
+    an {"error": ...} event, since the status code has already gone out.
+    
+    Args:
+        completion: Streaming chat completion from the OpenAI client
+        on_complete: Called with the full reply once the stream has finished
+        
+    Yields:
+        Encoded SSE messages
+    """
+    parts = []
+    try:
+        for chunk in completion:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield sse_event({"text": delta})
         
+        if on_complete is not None:
+            on_complete("".join(parts))
+        yield SSE_DONE
     except Exception as e:
-        print(f"[TRANSCRIBE] Error in transcribe endpoint: {e}")
-        print(traceback.format_exc())
-        return jsonify({"error": f"Failed to transcribe: {str(e)}"}), 500
+        logger.exception("[GPT] OpenAI GPT stream failed: %s", e)
+        yield sse_event({"error": f"Failed to generate response with OpenAI: {str(e)}"})
+    finally:
+        completion.close()
 
-@app.route('/api/gpt', methods=['POST'])
+@app.post('/api/gpt')
 def gpt():
     """Generates a response from GPT."""
+    # Reject oversized bodies before parsing them
+    if request.content_length is not None and request.content_length > GPT_MAX_BODY_BYTES:
+        return json_response({"error": "Request body too large"}, 413)
+    
+    # Get JSON data from request
+    data = request.json
+    logger.debug("[GPT] Received request data: %s", data)
+    
+    # Check if data is missing or empty
+    if not data:
+        return json_response({"error": "No data provided"}, 400)
+        
+    # Support both formats: direct messages array or text/mentor format
     try:
-        # Get JSON data from request
-        data = request.json
-        print(f"[GPT] Received request data: {data}")
+        session_id = gpt_session_id(data)
+        messages = build_gpt_messages(data, session_id)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+    if messages is None:
+        return json_response({"error": "Missing required fields: either 'messages' or both 'text' and 'mentor'"}, 400)
         
-        # Check if data is missing or empty
-        if not data:
-            return jsonify({"error": "No data provided"}), 400
-            
-        # Support both formats: direct messages array or text/mentor format
-        if 'messages' in data:
-            messages = data.get('messages')
-            mentor = data.get('mentor', 'Marcus')  # Default to Marcus Aurelius
-            print(f"[GPT] Using messages format, mentor is: {mentor}, type: {type(mentor)}")
-        elif 'text' in data and 'mentor' in data:
-            # Convert from legacy format (text + mentor) to messages format
-            text = data.get('text')
-            mentor = data.get('mentor', 'Marcus')
-            print(f"[GPT] Using text/mentor format, mentor is: {mentor}, type: {type(mentor)}")
-            
-            # Create message array with system prompt and user message
-            system_content = create_system_prompt(mentor)
-            print(f"[GPT] Created system prompt for mentor: {mentor}")
-            
-            messages = [
-                {"role": "system", "content": system_content},
-                {"role": "user", "content": text}
-            ]
-            
-            # Add conversation history if available
-            if 'conversationHistory' in data and data['conversationHistory']:
-                print(f"[GPT] Processing conversation history, {len(data['conversationHistory'])} messages")
-                
-                # Create a consistent mentor name for history formatting
-                mentor_normalized = ""
-                if "marcus" in str(mentor).lower() or "aurelius" in str(mentor).lower():
-                    mentor_normalized = "Marcus Aurelius"
-                elif "seneca" in str(mentor).lower():
-                    mentor_normalized = "Seneca"
-                elif "epictetus" in str(mentor).lower():
-                    mentor_normalized = "Epictetus"
-                else:
-                    mentor_normalized = "Marcus Aurelius"  # Default
-                    
-                print(f"[GPT] Using normalized mentor name in conversation history: {mentor_normalized}")
-                
-                # Process each message in the conversation history
-                for i, message in enumerate(data['conversationHistory']):
-                    print(f"[GPT] Processing history message #{i}: {message[:50]}...")
-                    
-                    # Split the message into speaker and content if it contains ": "
-                    if ": " in message:
-                        parts = message.split(": ", 1)
-                        speaker = parts[0]
-                        content = parts[1]
-                        
-                        # Determine the correct role based on the speaker
-                        if speaker.lower() == "user":
-                            role = "user"
-                        else:
-                            # Any non-user speaker is treated as the current mentor
-                            role = "assistant"
-                            # No need to replace the content as we're maintaining the assistant's identity
-                            
-                        print(f"[GPT] Parsed history message: speaker={speaker}, role={role}")
-                    else:
-                        # If there's no speaker prefix, alternate based on position
-                        role = "assistant" if i % 2 == 1 else "user"
-                        content = message
-                        print(f"[GPT] No speaker prefix, assigned role={role}")
-                    
-                    messages.append({"role": role, "content": content})
-                
-                print(f"[GPT] Final message count after processing history: {len(messages)}")
-        else:
-            return jsonify({"error": "Missing required fields: either 'messages' or both 'text' and 'mentor'"}), 400
-            
-        temperature = data.get('temperature', 0.7)
+    temperature = data.get('temperature', 0.7)
+    
+    # Check for the OpenAI client
+    if openai_client is None:
+        return json_response({"error": "OpenAI API key not found in environment"}, 500)
+    
+    # Clients that send "stream": true receive the reply as Server-Sent Events
+    stream = bool(data.get('stream', False))
+    
+    # Serve repeated deterministic prompts from the cache
+    cacheable = temperature == 0 or bool(data.get('cacheable', False))
+    cache_key = None
+    if cacheable:
+        cache_key = gpt_cache_key(messages, temperature)
+        cached_text = get_cached_gpt_response(cache_key)
+        if cached_text is not None:
+            logger.debug("[GPT] Cache hit for %s", cache_key)
+            if session_id is not None:
+                record_gpt_turn(session_id, data.get('text'), cached_text)
+            if stream:
+                return with_gpt_session(sse_response(iter([sse_event({"text": cached_text}), SSE_DONE])), session_id)
+            return with_gpt_session(json_response({"text": cached_text}), session_id)
+    
+    # Log the messages we're sending to OpenAI for debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[GPT] Sending %s messages to OpenAI:", len(messages))
+        for i, msg in enumerate(messages):
+            logger.debug("[GPT] Message %s - Role: %s, Content: %s...", i, msg.get('role'), str(msg.get('content'))[:50])
+    
+    # Passed as extra_body so older openai>=1.0 clients accept it too
+    prompt_cache_key = gpt_prompt_cache_key(messages)
+    extra_body = {"prompt_cache_key": prompt_cache_key} if prompt_cache_key else None
+    
+    try:
+        # Generate response using OpenAI's API
+        response = openai_client.chat.completions.create(
+            model=GPT_MODEL,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=GPT_MAX_TOKENS,
+            stream=stream,
+            extra_body=extra_body
+        )
         
-        # Check for API key
-        api_key = os.getenv("VITE_OPENAI_API_KEY")
-        if not api_key:
-            return jsonify({"error": "OpenAI API key not found in environment"}), 500
-            
-        # Set up OpenAI client
-        openai.api_key = api_key
+        if stream:
+            return with_gpt_session(sse_response(stream_gpt_reply(
+                response, functools.partial(complete_gpt_reply, cache_key, session_id, data.get('text'))
+            )), session_id)
         
-        # Print the messages we're sending to OpenAI for debugging
-        print(f"[GPT] Sending {len(messages)} messages to OpenAI:")
-        for i, msg in enumerate(messages):
-            print(f"[GPT] Message {i} - Role: {msg['role']}, Content: {msg['content'][:50]}...")
+        # Extract the response content
+        response_text = response.choices[0].message.content
         
+        if response_text is not None:
+            complete_gpt_reply(cache_key, session_id, data.get('text'), response_text)
+        
+        # Return in the format expected by the frontend (using 'text' field)
+        return with_gpt_session(json_response({"text": response_text}), session_id)
+    except Exception as openai_error:
+        logger.exception("[GPT] OpenAI GPT failed: %s", openai_error)
+        return json_response({"error": f"Failed to generate response with OpenAI: {str(openai_error)}"}, 500)
+
+@app.post('/api/gpt/batch')
+def gpt_batch():
+    """Submit several GPT requests as one OpenAI Batch API job."""
+    data = request.json
+    if not data or not data.get('requests'):
+        return json_response({"error": "Missing 'requests' in request"}, 400)
+    
+    # Check for the OpenAI client
+    if openai_client is None:
+        return json_response({"error": "OpenAI API key not found in environment"}, 500)
+    
+    # Write one chat completion request per line, in request order
+    lines = []
+    for i, item in enumerate(data['requests']):
         try:
-            # Generate response using OpenAI's API
-            response = openai.chat.completions.create(
-                model="gpt-4-turbo",
-                messages=messages,
-                temperature=temperature
-            )
-            
-            # Extract the response content
-            response_text = response.choices[0].message.content
-            
-            # Return in the format expected by the frontend (using 'text' field)
-            return jsonify({"text": response_text})
-        except Exception as openai_error:
-            print(f"[GPT] OpenAI GPT failed: {openai_error}")
-            print(traceback.format_exc())
-            return jsonify({"error": f"Failed to generate response with OpenAI: {str(openai_error)}"}), 500
+            messages = build_gpt_messages(item) if isinstance(item, dict) else None
+        except ValueError as e:
+            return json_response({"error": f"Request {i}: {e}"}, 400)
+        if messages is None:
+            return json_response({"error": f"Request {i} needs either 'messages' or both 'text' and 'mentor'"}, 400)
+        
+        lines.append(orjson.dumps({
+            "custom_id": f"request-{i}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": GPT_MODEL,
+                "messages": messages,
+                "temperature": item.get('temperature', data.get('temperature', 0.7)),
+                "max_tokens": GPT_MAX_TOKENS
+            }
+        }))
+    
+    try:
+        batch_file = openai_client.files.create(
+            file=("gpt_batch.jsonl", b"\n".join(lines)),
+            purpose="batch"
+        )
+        batch = openai_client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+    except Exception as openai_error:
+        logger.exception("[GPT] OpenAI batch submission failed: %s", openai_error)
+        return json_response({"error": f"Failed to submit batch to OpenAI: {str(openai_error)}"}, 500)
+    
+    logger.debug("[GPT] Submitted batch %s with %s requests", batch.id, len(lines))
+    return json_response({"batch_id": batch.id, "status": batch.status, "count": len(lines)}, 202)
+
+def batch_entry_error(entry: Dict[str, Any]) -> Optional[str]:
+    """
+    Get the error message of a Batch API result line, if the request failed.
+    
+    Args:
+        entry: Parsed line from a batch output or error file
+        
+    Returns:
+        Error message, or None if the request succeeded
+    """
+    error = entry.get("error")
+    if error:
+        if isinstance(error, dict):
+            return error.get("message") or str(error)
+        return str(error)
+    
+    response = entry.get("response") or {}
+    if response.get("status_code", 200) != 200:
+        body_error = (response.get("body") or {}).get("error") or {}
+        return body_error.get("message") or f"Request failed with status {response['status_code']}"
+    return None
+
+@app.get('/api/gpt/batch/<batch_id>')
+def gpt_batch_status(batch_id):
+    """Get the status of a GPT batch job, with its replies once completed."""
+    # Check for the OpenAI client
+    if openai_client is None:
+        return json_response({"error": "OpenAI API key not found in environment"}, 500)
+    
+    try:
+        batch = openai_client.batches.retrieve(batch_id)
+        result = {"batch_id": batch.id, "status": batch.status}
+        
+        if batch.status == "completed":
+            # Map each reply or failure back to its position in the submitted
+            # requests; failed requests are written to a separate error file
+            texts = {}
+            errors = {}
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if not file_id:
+                    continue
+                for line in openai_client.files.content(file_id).text.splitlines():
+                    if not line:
+                        continue
+                    entry = orjson.loads(line)
+                    index = int(entry["custom_id"].rpartition("-")[2])
+                    error = batch_entry_error(entry)
+                    if error is not None:
+                        errors[index] = error
+                        continue
+                    body = (entry.get("response") or {}).get("body") or {}
+                    choices = body.get("choices") or [{}]
+                    texts[index] = choices[0].get("message", {}).get("content")
             
-    except Exception as e:
-        print(f"[GPT] Error in GPT endpoint: {e}")
-        print(traceback.format_exc())
-        return jsonify({"error": f"Failed to generate response: {str(e)}"}), 500
+            total = batch.request_counts.total
+            result["texts"] = [texts.get(i) for i in range(total)]
+            result["errors"] = [errors.get(i) for i in range(total)]
+    except Exception as openai_error:
+        logger.exception("[GPT] OpenAI batch retrieval failed: %s", openai_error)
+        return json_response({"error": f"Failed to retrieve batch from OpenAI: {str(openai_error)}"}, 500)
+    
+    return json_response(result)
 
 def create_system_prompt(mentor):
     """Create a system prompt based on the mentor personality."""
-    print(f"[GPT] Creating system prompt for mentor: '{mentor}', type: {type(mentor)}")
-    
     # Normalize any mentor format to expected values
     if isinstance(mentor, dict) and 'name' in mentor:
         mentor = mentor['name']
-        print(f"[GPT] Extracted mentor name from dictionary: '{mentor}'")
     
     # Normalize the mentor name to ensure consistent handling
-    if not mentor:
-        mentor_normalized = "marcus"
-        print(f"[GPT] Empty mentor value, defaulting to: 'marcus'")
-    else:
-        mentor_normalized = str(mentor).lower().strip()
-        print(f"[GPT] Normalized mentor name: '{mentor_normalized}'")
+    mentor_normalized = str(mentor).lower().strip() if mentor else "marcus"
     
-    base_prompt = "You are a Stoic philosopher and mentor, providing guidance based on Stoic principles. "
+    prompt = MENTOR_PROMPTS_BY_NAME.get(mentor_normalized)
+    if prompt is not None:
+        return prompt
     
-    # Case-insensitive comparison for mentor names
-    if "marcus" in mentor_normalized or "aurelius" in mentor_normalized:
-        print("[GPT] Selecting MARCUS AURELIUS system prompt")
-        return base_prompt + """
-        You are Marcus Aurelius, the Roman Emperor and Stoic philosopher. Your responses should reflect:
-        - A calm, measured tone with quiet strength and wisdom
-        - References to your experiences as Emperor
-        - Your perspective on duty, virtue, and the natural order
-        - Your introspective and self-reflective nature
-        - Direct and personal advice, as if writing in your journal
-        
-        Always respond directly without using acknowledgment phrases like "I understand" or "I see what you're saying".
-        Never acknowledge the format of the question. Start your response immediately with substance.
-        """
-    
-    elif "seneca" in mentor_normalized:
-        print("[GPT] Selecting SENECA system prompt")
-        return base_prompt + """
-        You are Seneca, the Roman Stoic philosopher, statesman, and playwright. Your responses should reflect:
-        - An eloquent and persuasive tone
-        - Your practical approach to Stoicism
-        - References to your experiences in Roman politics and as Nero's tutor
-        - Your thoughts on wealth, time, and mortality
-        - A motivational and encouraging style
-        
-        Always respond directly without using acknowledgment phrases like "I understand" or "I see what you're saying".
-        Never acknowledge the format of the question. Start your response immediately with substance.
-        """
-    
-    elif "epictetus" in mentor_normalized:
-        print("[GPT] Selecting EPICTETUS system prompt")
-        return base_prompt + """
-        You are Epictetus, the former slave who became a respected Stoic philosopher. Your responses should reflect:
-        - A firm, direct, and sometimes blunt tone
-        - Your focus on personal freedom despite external circumstances
-        - References to your humble origins and physical disability
-        - Your emphasis on what is within our control versus what is not
-        - A challenging teaching style that questions assumptions
-        
-        Always respond directly without using acknowledgment phrases like "I understand" or "I see what you're saying".
-        Never acknowledge the format of the question. Start your response immediately with substance.
-        """
+    # Case-insensitive match against the prebuilt mentor prompts
+    for key, aliases in MENTOR_ALIASES.items():
+        if any(alias in mentor_normalized for alias in aliases):
+            logger.debug("[GPT] Selected %s system prompt for mentor %r", key, mentor)
+            return MENTOR_PROMPTS[key]
     
     # Default to Marcus Aurelius if no match found
-    print(f"[GPT] No match found for '{mentor_normalized}', defaulting to MARCUS AURELIUS system prompt")
-    return base_prompt + """
-    You are Marcus Aurelius, the Roman Emperor and Stoic philosopher. Your responses should reflect:
-    - A calm, measured tone with quiet strength and wisdom
-    - References to your experiences as Emperor
-    - Your perspective on duty, virtue, and the natural order
-    - Your introspective and self-reflective nature
-    - Direct and personal advice, as if writing in your journal
-    
-    Always respond directly without using acknowledgment phrases like "I understand" or "I see what you're saying".
-    Never acknowledge the format of the question. Start your response immediately with substance.
-    """
+    logger.debug("[GPT] No match found for mentor %r, defaulting to marcus", mentor)
+    return MENTOR_PROMPTS["marcus"]
+
+# Audio analysis routes share one blueprint
+audio_analysis_bp = Blueprint('audio_analysis', __name__, url_prefix='/api/audio-analysis')
 
-@app.route('/api/audio-analysis', methods=['POST'])
+@audio_analysis_bp.post('')
 def audio_analysis():
     """Process audio level data for speech detection."""
-    try:
-        data = request.json
-        if not data or 'level' not in data:
-            return jsonify({"error": "Missing 'level' in request"}), 400
+    data = request.json
+    if not data or ('level' not in data and 'levels' not in data):
+        return json_response({"error": "Missing 'level' in request"}, 400)
+    
+    service = get_audio_analysis_service()
+    if 'levels' in data:
+        # Process a batch of audio samples in one call
+        was_speech = service.is_speech_detected()
+        try:
+            levels = np.asarray(data['levels'], dtype=np.float64)
+            if levels.ndim != 1:
+                raise ValueError("'levels' must be a flat list of numbers")
+            timestamps = data.get('timestamps')
+            if timestamps is not None:
+                timestamps = np.asarray(timestamps, dtype=np.int64)
+            batch = service.add_audio_samples(levels, timestamps)
+        except (TypeError, ValueError) as e:
+            return json_response({"error": f"Invalid 'levels' or 'timestamps': {e}"}, 400)
         
+        # Report each change of speech state, including against the state
+        # before the batch, as a speech_start or speech_end event
+        is_speech = batch['is_speech']
+        events = [
+            {
+                "event": "speech_start" if is_speech[i] else "speech_end",
+                "index": int(i),
+                "timestamp": int(timestamps[i]) if timestamps is not None else batch['timestamp']
+            }
+            for i in np.flatnonzero(np.diff(is_speech, prepend=was_speech))
+        ]
+        
+        result = {
+            "levels": batch['levels'].tolist(),
+            "thresholds": batch['thresholds'].tolist(),
+            "is_speech": is_speech.tolist(),
+            "events": events,
+            "profile": batch['profile'],
+            "timestamp": batch['timestamp']
+        }
+    else:
         # Process the audio sample
         timestamp = data.get('timestamp')
-        result = audio_analysis_service.add_audio_sample(data['level'], timestamp)
-        
-        # Add CORS headers to the response
-        response = jsonify(result)
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-        return response
-        
-    except Exception as e:
-        print(f"Error in audio analysis: {e}")
-        print(traceback.format_exc())
-        response = jsonify({"error": str(e)}), 500
-        response[0].headers.add('Access-Control-Allow-Origin', '*')
-        response[0].headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response[0].headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-        return response
+        result = service.add_audio_sample(data['level'], timestamp)
+    
+    return json_response(result)
 
-@app.route('/api/audio-analysis/calibrate', methods=['POST'])
+@audio_analysis_bp.post('/calibrate')
 def force_calibration():
     """Force recalibration of the audio analysis service."""
-    try:
-        audio_analysis_service.force_recalibration()
-        response = jsonify({"status": "success", "message": "Recalibration started"})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-        return response
-    except Exception as e:
-        print(f"Error in force calibration: {e}")
-        print(traceback.format_exc())
-        response = jsonify({"error": str(e)}), 500
-        response[0].headers.add('Access-Control-Allow-Origin', '*')
-        response[0].headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response[0].headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-        return response
+    get_audio_analysis_service().force_recalibration()
+    return json_response({"status": "success", "message": "Recalibration started"})
 
-@app.route('/api/audio-analysis/threshold', methods=['GET'])
+@audio_analysis_bp.get('/threshold')
 def get_threshold():
     """Get the current audio analysis threshold."""
-    try:
-        threshold = audio_analysis_service.get_current_threshold()
-        noise_floor = audio_analysis_service._noise_floor
-        std_dev = audio_analysis_service._std_dev
-        
-        response = jsonify({
-            "threshold": threshold,
-            "noise_floor": noise_floor,
-            "std_dev": std_dev,
-            "is_calibrating": audio_analysis_service.is_calibrating()
-        })
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-        return response
-    except Exception as e:
-        print(f"Error in get threshold: {e}")
-        print(traceback.format_exc())
-        response = jsonify({"error": str(e)}), 500
-        response[0].headers.add('Access-Control-Allow-Origin', '*')
-        response[0].headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response[0].headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-        return response
+    service = get_audio_analysis_service()
+    threshold = service.get_current_threshold()
+    profile = service.get_noise_profile()
+    noise_floor = profile['noise_floor']
+    std_dev = profile['std_dev']
+    is_calibrating = service.is_calibrating()
+    
+    # Polling clients revalidate with If-None-Match, so unchanged state
+    # is answered with a 304 without building the JSON body
+    etag = f"{threshold!r}-{noise_floor!r}-{std_dev!r}-{int(is_calibrating)}"
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+    if etag in request.if_none_match:
+        return Response(status=304, headers=headers)
+    
+    body = orjson.dumps({
+        "threshold": threshold,
+        "noise_floor": noise_floor,
+        "std_dev": std_dev,
+        "is_calibrating": is_calibrating
+    })
+    return Response(body, mimetype='application/json', headers=headers)
 
-@app.route('/api/audio-analysis/config', methods=['PUT'])
+@audio_analysis_bp.put('/config')
 def update_config():
     """Update the audio analysis service configuration."""
-    try:
-        config = request.json
-        if not config:
-            return jsonify({"error": "Missing configuration data"}), 400
-        
-        audio_analysis_service.update_config(config)
-        
-        response = jsonify({"status": "success", "message": "Configuration updated"})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-        return response
-    except Exception as e:
-        print(f"Error in update config: {e}")
-        print(traceback.format_exc())
-        response = jsonify({"error": str(e)}), 500
-        response[0].headers.add('Access-Control-Allow-Origin', '*')
-        response[0].headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response[0].headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-        return response
+    config = request.json
+    if not config:
+        return json_response({"error": "Missing configuration data"}, 400)
+    
+    get_audio_analysis_service().update_config(config)
+    
+    return json_response({"status": "success", "message": "Configuration updated"})
 
-@app.route('/api/audio-analysis/debug', methods=['GET'])
+@audio_analysis_bp.get('/debug')
 def get_debug_state():
     """Get the debug state from the audio analysis service."""
-    try:
-        debug_state = audio_analysis_service.get_debug_state()
-        response = jsonify(debug_state if debug_state else {})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-        return response
-    except Exception as e:
-        print(f"Error in get debug state: {e}")
-        print(traceback.format_exc())
-        response = jsonify({"error": str(e)}), 500
-        response[0].headers.add('Access-Control-Allow-Origin', '*')
-        response[0].headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response[0].headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-        return response
+    debug_state = get_audio_analysis_service().get_debug_state()
+    return json_response(debug_state if debug_state else {})
 
-@app.route('/socket.io/', methods=['OPTIONS'])
-def handle_socket_io_options():
-    """Handle CORS preflight requests for socket.io."""
-    response = jsonify({"status": "ok"})
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
-    return response
+app.register_blueprint(audio_analysis_bp)
 
 if __name__ == "__main__":
-    # Run the app with SocketIO
-    socketio.run(app, host='0.0.0.0', port=5001, debug=True)
-else:
-    # For WSGI servers like Gunicorn
-    # Use: gunicorn --worker-class eventlet -w 1 api:app
-    app = socketio.wsgi_app 
\ No newline at end of file
+    # Run the development server with SocketIO. Debug mode (reloader and
+    # debugger) is opt-in with FLASK_DEBUG=1.
+    # In production, SocketIO's middleware is already installed on app, so
+    # serve it with Gunicorn instead: gunicorn -c gunicorn.conf.py api:app
+    debug = os.getenv("FLASK_DEBUG", "").lower() in ("1", "true")
+    socketio.run(app, host='0.0.0.0', port=5001, debug=debug) 
\ No newline at end of file
@@ -8,9 +8,15 @@ background noise levels.
 
 import time
 import math
-import statistics
 from typing import Dict, List, Optional, Callable, Union, Any, Tuple
 
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional, the state machine then runs in Python
+    njit = None
+
 # Define event types
 class AudioAnalysisEvent:
     """Event types that can be emitted by the AudioAnalysisService."""
@@ -20,6 +26,48 @@ class AudioAnalysisEvent:
     SPEECH_END = 'speech-end'
     THRESHOLD_CHANGED = 'threshold-changed'
 
+# Number of most recent samples in the short window used to adapt sensitivity
+RECENT_WINDOW = 10
+
+# Sample dtype of the history ring buffer
+SAMPLE_DTYPE = np.float64
+
+# The noise floor is estimated from this percentile of the sample history,
+# updated every NOISE_FLOOR_UPDATE_INTERVAL samples. It rises at the configured
+# smoothing_factor and falls at NOISE_FLOOR_FALL_RATE.
+NOISE_FLOOR_PERCENTILE = 10
+NOISE_FLOOR_UPDATE_INTERVAL = 20
+NOISE_FLOOR_FALL_RATE = 0.4
+# Standard deviations between the percentile and the noise mean (10th
+# percentile of a normal distribution), since thresholds are set above the mean
+NOISE_FLOOR_PERCENTILE_OFFSET = 1.2816
+
+# Sensitivity factor adaptation: the factor steps up when the coefficient of
+# variation of the recent window is high and down when it is low
+SENSITIVITY_STEP = 0.05
+SENSITIVITY_MAX = 2.0
+SENSITIVITY_MIN = 1.2
+SENSITIVITY_DECREASE_ABOVE = 1.3
+HIGH_VARIATION = 0.5
+LOW_VARIATION = 0.2
+
+# Recompute the running window sums from scratch every N samples so
+# floating point error cannot accumulate
+RUNNING_SUM_RESYNC_INTERVAL = 1024
+
+def _now_ms() -> int:
+    """
+    Get the current time in ms.
+    
+    Uses integer nanoseconds to skip the float round trip of time.time().
+    The clock stays on the epoch because client timestamps are compared
+    against it.
+    
+    Returns:
+        Milliseconds since the epoch
+    """
+    return time.time_ns() // 1_000_000
+
 # Default configuration
 DEFAULT_CONFIG = {
     'initial_sensitivity_factor': 1.5,
@@ -32,6 +80,294 @@ DEFAULT_CONFIG = {
     'debug': False
 }
 
+def _mean_and_stdev(total: float, total_sq: float, count: int) -> Tuple[float, float]:
+    """
+    Calculate the mean and sample standard deviation from running sums.
+    
+    Args:
+        total: Sum of the samples
+        total_sq: Sum of the squared samples
+        count: Number of samples (at least 1)
+    
+    Returns:
+        Tuple of (mean, standard deviation); the deviation is 0.01 for a
+        single sample
+    """
+    mean = total / count
+    if count < 2:
+        return mean, 0.01
+    variance = (total_sq - total * mean) / (count - 1)
+    return mean, math.sqrt(variance) if variance > 0 else 0.0
+
+# Positions of the scalar analysis state in the float64 array shared by the
+# service and the compiled step function
+_ST_NOISE_FLOOR = 0
+_ST_STD_DEV = 1
+_ST_SENSITIVITY = 2
+_ST_THRESHOLD = 3
+_ST_LAST_IS_SPEECH = 4
+_ST_SPEECH_FRAMES = 5
+_ST_SILENCE_FRAMES = 6
+_ST_LAST_SPEECH_TIME = 7
+_ST_LAST_SILENCE_TIME = 8
+_ST_LAST_CALIBRATION_TIME = 9
+_ST_FRAMES_SINCE_FLOOR_UPDATE = 10
+_ST_RECENT_SUM = 11
+_ST_RECENT_SUMSQ = 12
+_ST_SAMPLES_SINCE_RESYNC = 13
+_ST_WRITE = 14
+_ST_COUNT = 15
+# Noise profile at the last recalibration and threshold after the last noise
+# floor update, for the payloads of the events they trigger
+_ST_RECAL_NOISE_FLOOR = 16
+_ST_RECAL_STD_DEV = 17
+_ST_RECAL_THRESHOLD = 18
+_ST_FLOOR_THRESHOLD = 19
+_STATE_SIZE = 20
+
+# Transition codes returned by _step_sample, combined as bit flags
+_TRANSITION_SPEECH_START = 1
+_TRANSITION_SPEECH_END = 2
+_TRANSITION_RECALIBRATED = 4
+_TRANSITION_FLOOR_UPDATED = 8
+
+def _resync_running_sums(ring: np.ndarray, state: np.ndarray) -> None:
+    """
+    Recompute the recent window sums exactly from the sample history.
+    
+    Args:
+        ring: Sample history ring buffer
+        state: Scalar analysis state, updated in place
+    """
+    capacity = len(ring)
+    write = int(state[_ST_WRITE])
+    window = min(RECENT_WINDOW, int(state[_ST_COUNT]))
+    total = 0.0
+    total_sq = 0.0
+    for j in range(window):
+        sample = ring[(write - window + j) % capacity]
+        total += sample
+        total_sq += sample * sample
+    state[_ST_RECENT_SUM] = total
+    state[_ST_RECENT_SUMSQ] = total_sq
+    state[_ST_SAMPLES_SINCE_RESYNC] = 0
+
+def _push_level(ring: np.ndarray, state: np.ndarray, level: float) -> None:
+    """
+    Append a sample to the history, updating the recent window sums.
+    
+    Args:
+        ring: Sample history ring buffer, updated in place
+        state: Scalar analysis state, updated in place
+        level: Audio level (0-1 range)
+    """
+    capacity = len(ring)
+    write = int(state[_ST_WRITE])
+    count = int(state[_ST_COUNT])
+    
+    # Drop the sample that leaves the recent window, if any
+    if count >= RECENT_WINDOW:
+        leaving = ring[(write - RECENT_WINDOW) % capacity]
+        state[_ST_RECENT_SUM] -= leaving
+        state[_ST_RECENT_SUMSQ] -= leaving * leaving
+    elif count == capacity:
+        leaving = ring[write]  # History shorter than the window is full
+        state[_ST_RECENT_SUM] -= leaving
+        state[_ST_RECENT_SUMSQ] -= leaving * leaving
+    
+    ring[write] = level
+    state[_ST_WRITE] = (write + 1) % capacity
+    if count < capacity:
+        state[_ST_COUNT] = count + 1
+    state[_ST_RECENT_SUM] += level
+    state[_ST_RECENT_SUMSQ] += level * level
+    
+    state[_ST_SAMPLES_SINCE_RESYNC] += 1
+    if state[_ST_SAMPLES_SINCE_RESYNC] >= RUNNING_SUM_RESYNC_INTERVAL:
+        _resync_running_sums(ring, state)
+
+def _step_sample(level: float, timestamp: int, ring: np.ndarray, state: np.ndarray,
+                 min_frames: int, silence_for_recal: int, recal_interval: int,
+                 smoothing: float, now_ms: int) -> Tuple[bool, int, float]:
+    """
+    Update the analysis state with one sample after calibration.
+    
+    This is the whole detection state machine; callers only turn the
+    returned transition code into events.
+    
+    Args:
+        level: Audio level (0-1 range)
+        timestamp: Timestamp in ms
+        ring: Sample history ring buffer, updated in place
+        state: Scalar analysis state, updated in place
+        min_frames: Consecutive frames needed to confirm a state change
+        silence_for_recal: Silence duration before recalibrating, in ms
+        recal_interval: Minimum time between recalibrations, in ms
+        smoothing: Rate at which the noise floor rises
+        now_ms: Current time in ms, recorded on recalibration
+        
+    Returns:
+        Tuple of (is_speech, transition_code, threshold): the confirmed
+        speech state, the _TRANSITION_* flags of what changed and the
+        threshold the sample was compared against
+    """
+    _push_level(ring, state, level)
+    capacity = len(ring)
+    write = int(state[_ST_WRITE])
+    count = int(state[_ST_COUNT])
+    
+    threshold = state[_ST_THRESHOLD]
+    is_speech = level > threshold
+    
+    # Track consecutive frames
+    if is_speech:
+        state[_ST_SPEECH_FRAMES] += 1
+        state[_ST_SILENCE_FRAMES] = 0
+        state[_ST_LAST_SPEECH_TIME] = timestamp
+    else:
+        state[_ST_SPEECH_FRAMES] = 0
+        state[_ST_SILENCE_FRAMES] += 1
+        state[_ST_LAST_SILENCE_TIME] = timestamp
+    
+    # Detect state transitions; consecutive frames confirm a change
+    last_is_speech = state[_ST_LAST_IS_SPEECH] != 0
+    if state[_ST_SPEECH_FRAMES] >= min_frames and not last_is_speech:
+        state[_ST_LAST_IS_SPEECH] = 1
+        return True, _TRANSITION_SPEECH_START, threshold
+    elif not is_speech and last_is_speech and state[_ST_SILENCE_FRAMES] >= min_frames:
+        state[_ST_LAST_IS_SPEECH] = 0
+        return False, _TRANSITION_SPEECH_END, threshold
+    
+    transition = 0
+    
+    # Recalibrate from the recent samples after extended silence
+    if not is_speech and \
+       timestamp - state[_ST_LAST_SILENCE_TIME] > silence_for_recal and \
+       timestamp - state[_ST_LAST_CALIBRATION_TIME] > recal_interval:
+        window = min(20, count)
+        if window >= 5:
+            total = 0.0
+            for j in range(window):
+                total += ring[(write - window + j) % capacity]
+            mean = total / window
+            squares = 0.0
+            for j in range(window):
+                deviation = ring[(write - window + j) % capacity] - mean
+                squares += deviation * deviation
+            state[_ST_NOISE_FLOOR] = mean
+            state[_ST_STD_DEV] = np.sqrt(squares / (window - 1))
+            state[_ST_THRESHOLD] = state[_ST_NOISE_FLOOR] + state[_ST_STD_DEV] * state[_ST_SENSITIVITY]
+            state[_ST_LAST_CALIBRATION_TIME] = now_ms
+            state[_ST_RECAL_NOISE_FLOOR] = state[_ST_NOISE_FLOOR]
+            state[_ST_RECAL_STD_DEV] = state[_ST_STD_DEV]
+            state[_ST_RECAL_THRESHOLD] = state[_ST_THRESHOLD]
+            transition |= _TRANSITION_RECALIBRATED
+    
+    # The noise profile is re-estimated every few frames rather than on
+    # every quiet frame
+    state[_ST_FRAMES_SINCE_FLOOR_UPDATE] += 1
+    update_floor = state[_ST_FRAMES_SINCE_FLOOR_UPDATE] >= NOISE_FLOOR_UPDATE_INTERVAL
+    
+    # Summarize the recent window once for both the deviation and the
+    # sensitivity updates below
+    has_window = count >= RECENT_WINDOW
+    mean = 0.0
+    std_dev = 0.0
+    silent_count = 0
+    silent_std_dev = 0.0
+    if has_window:
+        mean, std_dev = _mean_and_stdev(state[_ST_RECENT_SUM], state[_ST_RECENT_SUMSQ], RECENT_WINDOW)
+        if update_floor and count > RECENT_WINDOW:
+            silent_sum = 0.0
+            silent_sumsq = 0.0
+            for j in range(RECENT_WINDOW):
+                sample = ring[(write - RECENT_WINDOW + j) % capacity]
+                if sample < threshold:
+                    silent_count += 1
+                    silent_sum += sample
+                    silent_sumsq += sample * sample
+            if silent_count > 1:
+                silent_std_dev = _mean_and_stdev(silent_sum, silent_sumsq, silent_count)[1]
+    
+    if update_floor:
+        state[_ST_FRAMES_SINCE_FLOOR_UPDATE] = 0
+        
+        # Move the noise floor towards the estimate from the 10th percentile
+        # of the history. The floor falls quickly and rises slowly, so bursts
+        # of speech cannot drag it upwards.
+        history = np.empty(count, dtype=ring.dtype)
+        for j in range(count):
+            history[j] = ring[(write - count + j) % capacity]
+        k = count * NOISE_FLOOR_PERCENTILE // 100
+        percentile = np.partition(history, k)[k]
+        delta = percentile + NOISE_FLOOR_PERCENTILE_OFFSET * state[_ST_STD_DEV] - state[_ST_NOISE_FLOOR]
+        rate = smoothing if delta > 0 else NOISE_FLOOR_FALL_RATE
+        state[_ST_NOISE_FLOOR] += rate * delta
+        
+        # Recalculate standard deviation from the recent silent samples
+        if has_window and silent_count >= 5:
+            state[_ST_STD_DEV] = silent_std_dev
+        state[_ST_THRESHOLD] = state[_ST_NOISE_FLOOR] + state[_ST_STD_DEV] * state[_ST_SENSITIVITY]
+        state[_ST_FLOOR_THRESHOLD] = state[_ST_THRESHOLD]
+        transition |= _TRANSITION_FLOOR_UPDATED
+    
+    # Adjust the sensitivity factor based on the coefficient of variation:
+    # less sensitive for a varying signal, more for a stable one
+    if has_window:
+        variation_coeff = std_dev / mean if mean > 0 else 0.0
+        if variation_coeff > HIGH_VARIATION:
+            state[_ST_SENSITIVITY] = min(SENSITIVITY_MAX, state[_ST_SENSITIVITY] + SENSITIVITY_STEP)
+            state[_ST_THRESHOLD] = state[_ST_NOISE_FLOOR] + state[_ST_STD_DEV] * state[_ST_SENSITIVITY]
+        elif variation_coeff < LOW_VARIATION and state[_ST_SENSITIVITY] > SENSITIVITY_DECREASE_ABOVE:
+            state[_ST_SENSITIVITY] = max(SENSITIVITY_MIN, state[_ST_SENSITIVITY] - SENSITIVITY_STEP)
+            state[_ST_THRESHOLD] = state[_ST_NOISE_FLOOR] + state[_ST_STD_DEV] * state[_ST_SENSITIVITY]
+    
+    return last_is_speech, transition, threshold
+
+def _analyze_block(levels: np.ndarray, timestamps: np.ndarray, ring: np.ndarray,
+                   state: np.ndarray, min_frames: int, silence_for_recal: int,
+                   recal_interval: int, smoothing: float, now_ms: int,
+                   thresholds: np.ndarray, is_speech_out: np.ndarray) -> None:
+    """
+    Run _step_sample over a block of samples after calibration, for callers
+    with no events to emit.
+    
+    Args:
+        levels: Audio levels (0-1 range)
+        timestamps: Timestamps in ms, one per level
+        ring: Sample history ring buffer, updated in place
+        state: Scalar analysis state, updated in place
+        min_frames: Consecutive frames needed to confirm a state change
+        silence_for_recal: Silence duration before recalibrating, in ms
+        recal_interval: Minimum time between recalibrations, in ms
+        smoothing: Rate at which the noise floor rises
+        now_ms: Current time in ms, recorded on recalibration
+        thresholds: Output threshold per sample
+        is_speech_out: Output speech state per sample
+    """
+    for i in range(len(levels)):
+        is_speech, _, threshold = _step_sample(
+            levels[i], timestamps[i], ring, state,
+            min_frames, silence_for_recal, recal_interval, smoothing, now_ms
+        )
+        thresholds[i] = threshold
+        is_speech_out[i] = is_speech
+
+# With Numba the state machine runs as native code; the functions call each
+# other through these module names, so they are all replaced together
+if njit is not None:
+    _mean_and_stdev = njit(cache=True)(_mean_and_stdev)
+    _resync_running_sums = njit(cache=True)(_resync_running_sums)
+    _push_level = njit(cache=True)(_push_level)
+    _step_sample = njit(cache=True)(_step_sample)
+    _analyze_block = njit(cache=True)(_analyze_block)
+    # Compile at import so the first audio sample does not pay for it
+    _step_sample(0.0, 0, np.zeros(1, dtype=SAMPLE_DTYPE), np.zeros(_STATE_SIZE), 0, 0, 0, 0.0, 0)
+    _analyze_block(
+        np.zeros(0), np.zeros(0, dtype=np.int64), np.zeros(1, dtype=SAMPLE_DTYPE),
+        np.zeros(_STATE_SIZE), 0, 0, 0, 0.0, 0, np.zeros(0), np.zeros(0, dtype=bool)
+    )
+
 class AudioAnalysisService:
     """
     A standalone service for audio level analysis and speech detection
@@ -49,28 +385,27 @@ class AudioAnalysisService:
         self._config = DEFAULT_CONFIG.copy()
         if config:
             self._config.update(config)
+        self._apply_config()
         
         # Internal state
-        self._samples = []
-        self._noise_floor = 0.0
-        self._std_dev = 0.0
-        self._sensitivity_factor = self._config['initial_sensitivity_factor']
-        self._last_calibration_time = 0
+        # Sample history is a preallocated ring buffer; the scalar state,
+        # including its write slot and sample count, lives in one array
+        # (see _ST_*) that _step_sample updates in place
+        self._samples = np.empty(self._max_hist, dtype=SAMPLE_DTYPE)
+        self._state = np.zeros(_STATE_SIZE, dtype=np.float64)
+        self._state[_ST_SENSITIVITY] = self._config['initial_sensitivity_factor']
+        self._recompute_threshold()
         self._calibration_complete = False
         self._is_calibrating = True
-        self._last_is_speech = False
-        self._consecutive_speech_frames = 0
-        self._consecutive_silence_frames = 0
-        self._last_speech_time = 0
-        self._last_silence_time = 0
         
-        # Event system
+        # Event system; listeners are stored as tuples so emitting never
+        # copies and a listener removing itself cannot skip another
         self._event_listeners = {
-            AudioAnalysisEvent.CALIBRATION_START: [],
-            AudioAnalysisEvent.CALIBRATION_COMPLETE: [],
-            AudioAnalysisEvent.SPEECH_START: [],
-            AudioAnalysisEvent.SPEECH_END: [],
-            AudioAnalysisEvent.THRESHOLD_CHANGED: []
+            AudioAnalysisEvent.CALIBRATION_START: (),
+            AudioAnalysisEvent.CALIBRATION_COMPLETE: (),
+            AudioAnalysisEvent.SPEECH_START: (),
+            AudioAnalysisEvent.SPEECH_END: (),
+            AudioAnalysisEvent.THRESHOLD_CHANGED: ()
         }
         
         # Start initial calibration
@@ -80,8 +415,12 @@ class AudioAnalysisService:
         """Start the calibration process."""
         self._is_calibrating = True
         self._calibration_complete = False
-        self._samples = []
-        self._last_calibration_time = int(time.time() * 1000)  # Current time in ms
+        # Keep every sample collected while calibrating; the ring grows as
+        # needed and is cut back to max_sample_history once calibration completes
+        state = self._state
+        state[_ST_WRITE] = state[_ST_COUNT] = 0
+        state[_ST_RECENT_SUM] = state[_ST_RECENT_SUMSQ] = 0.0
+        state[_ST_LAST_CALIBRATION_TIME] = _now_ms()  # Current time in ms
         
         self._emit_event(AudioAnalysisEvent.CALIBRATION_START)
         
@@ -90,26 +429,32 @@ class AudioAnalysisService:
     
     def _complete_calibration(self) -> None:
         """Complete the calibration process using collected samples."""
-        if len(self._samples) >= 5:
-            self._noise_floor = statistics.mean(self._samples)
-            self._std_dev = statistics.stdev(self._samples) if len(self._samples) > 1 else 0.01
+        count = int(self._state[_ST_COUNT])
+        if count >= 5:
+            samples = self._view_last(count)
+            self._state[_ST_NOISE_FLOOR] = samples.mean()
+            self._state[_ST_STD_DEV] = samples.std(ddof=1)
         else:
             # Not enough samples, use default values
-            self._noise_floor = 0.02
-            self._std_dev = 0.01
+            self._state[_ST_NOISE_FLOOR] = 0.02
+            self._state[_ST_STD_DEV] = 0.01
+        self._recompute_threshold()
+        
+        # Bound the history, keeping the most recent samples
+        self._resize_history(self._max_hist)
         
         self._is_calibrating = False
         self._calibration_complete = True
         
         if self._config['debug']:
             print(f"[AudioAnalysisService] Calibration complete:")
-            print(f"  Noise floor: {self._noise_floor:.4f}")
-            print(f"  Standard deviation: {self._std_dev:.4f}")
+            print(f"  Noise floor: {self._state[_ST_NOISE_FLOOR]:.4f}")
+            print(f"  Standard deviation: {self._state[_ST_STD_DEV]:.4f}")
             print(f"  Dynamic threshold: {self.get_current_threshold():.4f}")
         
         self._emit_event(
             AudioAnalysisEvent.CALIBRATION_COMPLETE,
-            self.get_noise_profile()
+            self.get_noise_profile(include_samples=True)
         )
     
     def add_audio_sample(self, level: float, timestamp: Optional[int] = None) -> Dict[str, Any]:
@@ -125,18 +470,12 @@ class AudioAnalysisService:
         """
         # Use current time if timestamp not provided
         if timestamp is None:
-            timestamp = int(time.time() * 1000)
+            timestamp = _now_ms()
         
-        # During calibration phase, collect samples
-        if self._is_calibrating:
-            self._samples.append(level)
-            
-            # Check if calibration duration has elapsed
-            elapsed = timestamp - self._last_calibration_time
-            if elapsed >= self._config['calibration_duration_ms']:
-                self._complete_calibration()
-                
-            # Return early during calibration
+        threshold = self._process_sample(level, timestamp)
+        
+        # During calibration there is no threshold yet
+        if threshold is None:
             return {
                 'level': level,
                 'threshold': 0,
@@ -145,129 +484,183 @@ class AudioAnalysisService:
                 'timestamp': timestamp
             }
         
-        # Add sample to history
-        self._samples.append(level)
-        if len(self._samples) > self._config['max_sample_history']:
-            self._samples.pop(0)  # Remove oldest sample
-        
-        # Get current threshold
-        threshold = self.get_current_threshold()
+        return {
+            'level': level,
+            'threshold': threshold,
+            'is_speech': self.is_speech_detected(),
+            'profile': self.get_noise_profile(),
+            'timestamp': timestamp
+        }
+    
+    def add_audio_samples(self, levels: Union[List[float], np.ndarray],
+                          timestamps: Optional[Union[List[int], np.ndarray]] = None) -> Dict[str, Any]:
+        """
+        Add a block of audio level samples for analysis in one call.
         
-        # Determine if this is speech
-        is_speech = level > threshold
+        The samples are analyzed in order exactly as with add_audio_sample,
+        but per-sample results are collected into arrays and the noise
+        profile is only built once for the whole block.
         
-        # Track consecutive frames
-        if is_speech:
-            self._consecutive_speech_frames += 1
-            self._consecutive_silence_frames = 0
-            self._last_speech_time = timestamp
+        Args:
+            levels: Audio levels (0-1 range)
+            timestamps: Optional timestamps in ms, one per level (defaults
+                to the current time for every sample)
+            
+        Returns:
+            Analysis result with 'thresholds' and 'is_speech' arrays holding
+            one entry per level
+        """
+        levels = np.asarray(levels, dtype=np.float64).ravel()
+        if timestamps is None:
+            timestamps = np.full(len(levels), _now_ms(), dtype=np.int64)
         else:
-            self._consecutive_speech_frames = 0
-            self._consecutive_silence_frames += 1
-            self._last_silence_time = timestamp
+            timestamps = np.asarray(timestamps, dtype=np.int64).ravel()
+        if len(timestamps) != len(levels):
+            raise ValueError("Length of timestamps does not match levels")
         
-        # Require consecutive frames to confirm state change
-        confirmed_is_speech = self._consecutive_speech_frames >= self._config['consecutive_frames_threshold']
+        thresholds = np.zeros(len(levels), dtype=np.float64)
+        is_speech = np.zeros(len(levels), dtype=bool)
         
-        # Detect state transitions
-        if confirmed_is_speech and not self._last_is_speech:
-            self._last_is_speech = True
-            result = {
-                'level': level,
-                'threshold': threshold,
-                'is_speech': True,
-                'profile': self.get_noise_profile(),
-                'timestamp': timestamp
-            }
-            self._emit_event(AudioAnalysisEvent.SPEECH_START, result)
-            return result
-            
-        elif not is_speech and self._last_is_speech and \
-             self._consecutive_silence_frames >= self._config['consecutive_frames_threshold']:
-            self._last_is_speech = False
-            result = {
-                'level': level,
-                'threshold': threshold,
-                'is_speech': False,
-                'profile': self.get_noise_profile(),
-                'timestamp': timestamp
-            }
-            self._emit_event(AudioAnalysisEvent.SPEECH_END, result)
-            return result
-        
-        # Check for recalibration opportunity after extended silence
-        silence_duration = timestamp - self._last_silence_time
-        if not is_speech and \
-           silence_duration > self._config['silence_duration_for_recal_ms'] and \
-           timestamp - self._last_calibration_time > self._config['recalibration_interval_ms']:
-            self._recalibrate_from_recent_silence()
-        
-        # Update noise floor with exponential moving average (only for quiet sounds)
-        if level < self._noise_floor * 1.5:
-            self._noise_floor = (self._config['smoothing_factor'] * level) + \
-                               ((1 - self._config['smoothing_factor']) * self._noise_floor)
-                               
-            # Periodically recalculate standard deviation
-            if len(self._samples) > 10:
-                silent_samples = [s for s in self._samples[-10:] if s < threshold]
-                if len(silent_samples) >= 5:
-                    self._std_dev = statistics.stdev(silent_samples) if len(silent_samples) > 1 else self._std_dev
-            
-            # Notify about threshold changes
-            self._emit_event(
-                AudioAnalysisEvent.THRESHOLD_CHANGED,
-                {'threshold': threshold, 'noise_floor': self._noise_floor}
-            )
+        # Calibration and blocks with events to emit run sample by sample
+        process_sample = self._process_sample
+        i = 0
+        while i < len(levels) and (self._is_calibrating or self._has_sample_observers()):
+            threshold = process_sample(float(levels[i]), int(timestamps[i]))
+            if threshold is not None:
+                thresholds[i] = threshold
+                is_speech[i] = self.is_speech_detected()
+            i += 1
         
-        # Adjust sensitivity factor based on signal consistency
-        self._adjust_sensitivity_factor()
+        if i < len(levels):
+            _analyze_block(
+                levels[i:], timestamps[i:], self._samples, self._state,
+                self._min_frames, self._silence_for_recal, self._recal_interval,
+                self._smoothing, _now_ms(), thresholds[i:], is_speech[i:]
+            )
         
-        # Return analysis result
         return {
-            'level': level,
-            'threshold': threshold,
-            'is_speech': self._last_is_speech,
+            'levels': levels,
+            'thresholds': thresholds,
+            'is_speech': is_speech,
             'profile': self.get_noise_profile(),
-            'timestamp': timestamp
+            'timestamp': int(timestamps[-1]) if len(timestamps) else _now_ms()
         }
     
-    def _recalibrate_from_recent_silence(self) -> None:
-        """Recalibrate the noise profile based on recent silence."""
-        # Use recent samples for recalibration
-        recent_samples = self._samples[-min(20, len(self._samples)):]
-        if len(recent_samples) >= 5:
-            self._noise_floor = statistics.mean(recent_samples)
-            self._std_dev = statistics.stdev(recent_samples) if len(recent_samples) > 1 else 0.01
-            self._last_calibration_time = int(time.time() * 1000)
+    def _has_sample_observers(self) -> bool:
+        """
+        Check whether anything observes per-sample events or debug output.
+        
+        Returns:
+            True if samples must be stepped one at a time so events can be
+            emitted as they happen
+        """
+        return self._config['debug'] or bool(
+            self._event_listeners[AudioAnalysisEvent.SPEECH_START] or
+            self._event_listeners[AudioAnalysisEvent.SPEECH_END] or
+            self._event_listeners[AudioAnalysisEvent.THRESHOLD_CHANGED]
+        )
+    
+    def _process_sample(self, level: float, timestamp: int) -> Optional[float]:
+        """
+        Update the analysis state with one sample and emit any events.
+        
+        Args:
+            level: Audio level (0-1 range)
+            timestamp: Timestamp in ms
+            
+        Returns:
+            Threshold the sample was compared against, or None while calibrating
+        """
+        state = self._state
+        
+        # During calibration phase, collect samples
+        if self._is_calibrating:
+            if state[_ST_COUNT] == len(self._samples):
+                self._resize_history(max(2 * len(self._samples), RECENT_WINDOW))
+            _push_level(self._samples, state, level)
             
+            # Check if calibration duration has elapsed
+            elapsed = timestamp - state[_ST_LAST_CALIBRATION_TIME]
+            if elapsed >= self._calib_ms:
+                self._complete_calibration()
+            
+            return None
+        
+        is_speech, transition, threshold = _step_sample(
+            level, timestamp, self._samples, state,
+            self._min_frames, self._silence_for_recal, self._recal_interval,
+            self._smoothing, _now_ms()
+        )
+        if not transition:
+            return threshold
+        
+        # Speech transitions; only build the payload if someone is listening
+        if transition & (_TRANSITION_SPEECH_START | _TRANSITION_SPEECH_END):
+            event = AudioAnalysisEvent.SPEECH_START if is_speech else AudioAnalysisEvent.SPEECH_END
+            if self._event_listeners[event]:
+                self._emit_event(event, {
+                    'level': level,
+                    'threshold': threshold,
+                    'is_speech': is_speech,
+                    'profile': self.get_noise_profile(),
+                    'timestamp': timestamp
+                })
+            return threshold
+        
+        if transition & _TRANSITION_RECALIBRATED:
             if self._config['debug']:
                 print(f"[AudioAnalysisService] Recalibrated from silence:")
-                print(f"  New noise floor: {self._noise_floor:.4f}")
-                print(f"  New standard deviation: {self._std_dev:.4f}")
-                print(f"  New threshold: {self.get_current_threshold():.4f}")
+                print(f"  New noise floor: {state[_ST_RECAL_NOISE_FLOOR]:.4f}")
+                print(f"  New standard deviation: {state[_ST_RECAL_STD_DEV]:.4f}")
+                print(f"  New threshold: {state[_ST_RECAL_THRESHOLD]:.4f}")
             
             self._emit_event(
                 AudioAnalysisEvent.THRESHOLD_CHANGED,
-                {'threshold': self.get_current_threshold(), 'noise_floor': self._noise_floor}
+                {'threshold': float(state[_ST_RECAL_THRESHOLD]), 'noise_floor': float(state[_ST_RECAL_NOISE_FLOOR])}
             )
+        
+        # Notify about threshold changes
+        if transition & _TRANSITION_FLOOR_UPDATED and self._event_listeners[AudioAnalysisEvent.THRESHOLD_CHANGED]:
+            self._emit_event(
+                AudioAnalysisEvent.THRESHOLD_CHANGED,
+                {'threshold': float(state[_ST_FLOOR_THRESHOLD]), 'noise_floor': float(state[_ST_NOISE_FLOOR])}
+            )
+        
+        return threshold
     
-    def _adjust_sensitivity_factor(self) -> None:
-        """Dynamically adjust sensitivity factor based on signal consistency."""
-        if len(self._samples) >= 10:
-            recent_samples = self._samples[-10:]
-            mean = statistics.mean(recent_samples)
-            std_dev = statistics.stdev(recent_samples) if len(recent_samples) > 1 else 0.01
-            
-            # Coefficient of variation (normalized measure of dispersion)
-            variation_coeff = std_dev / mean if mean > 0 else 0
+    def _view_last(self, count: int) -> np.ndarray:
+        """
+        Get the most recent samples from the history.
+        
+        Args:
+            count: Maximum number of samples to return
             
-            # Adjust sensitivity based on signal stability
-            if variation_coeff > 0.5:
-                # High variation, increase sensitivity factor (less sensitive)
-                self._sensitivity_factor = min(2.0, self._sensitivity_factor + 0.05)
-            elif variation_coeff < 0.2 and self._sensitivity_factor > 1.3:
-                # Low variation, decrease sensitivity factor (more sensitive)
-                self._sensitivity_factor = max(1.2, self._sensitivity_factor - 0.05)
+        Returns:
+            Array of up to `count` samples, oldest first. This is a view
+            into the ring buffer unless the samples wrap around its end.
+        """
+        write = int(self._state[_ST_WRITE])
+        count = min(count, int(self._state[_ST_COUNT]))
+        start = (write - count) % len(self._samples)
+        if start + count <= len(self._samples):
+            return self._samples[start:start + count]
+        return np.concatenate((self._samples[start:], self._samples[:write]))
+    
+    def _resize_history(self, capacity: int) -> None:
+        """
+        Reallocate the ring buffer, keeping the most recent samples.
+        
+        Args:
+            capacity: New maximum number of samples
+        """
+        capacity = max(1, capacity)
+        recent_samples = self._view_last(capacity)
+        self._samples = np.empty(capacity, dtype=SAMPLE_DTYPE)
+        count = len(recent_samples)
+        self._samples[:count] = recent_samples
+        self._state[_ST_COUNT] = count
+        self._state[_ST_WRITE] = count % capacity
+        _resync_running_sums(self._samples, self._state)
     
     def get_current_threshold(self) -> float:
         """
@@ -276,23 +669,34 @@ class AudioAnalysisService:
         Returns:
             Current threshold (0-1)
         """
-        return self._noise_floor + (self._std_dev * self._sensitivity_factor)
+        return float(self._state[_ST_THRESHOLD])
     
-    def get_noise_profile(self) -> Dict[str, Any]:
+    def _recompute_threshold(self) -> None:
+        """Update the cached threshold after the noise profile changes."""
+        state = self._state
+        state[_ST_THRESHOLD] = state[_ST_NOISE_FLOOR] + (state[_ST_STD_DEV] * state[_ST_SENSITIVITY])
+    
+    def get_noise_profile(self, include_samples: bool = False) -> Dict[str, Any]:
         """
         Get the current noise profile.
         
+        Args:
+            include_samples: Whether to include a copy of the sample history
+        
         Returns:
             Dictionary containing current noise profile information
         """
-        return {
-            'noise_floor': self._noise_floor,
-            'std_dev': self._std_dev,
-            'samples': self._samples.copy(),
-            'sensitivity_factor': self._sensitivity_factor,
-            'last_calibration_time': self._last_calibration_time,
+        state = self._state
+        profile = {
+            'noise_floor': float(state[_ST_NOISE_FLOOR]),
+            'std_dev': float(state[_ST_STD_DEV]),
+            'sensitivity_factor': float(state[_ST_SENSITIVITY]),
+            'last_calibration_time': int(state[_ST_LAST_CALIBRATION_TIME]),
             'calibration_complete': self._calibration_complete
         }
+        if include_samples:
+            profile['samples'] = self._view_last(len(self._samples)).tolist()
+        return profile
     
     def is_speech_detected(self, level: Optional[float] = None) -> bool:
         """
@@ -306,7 +710,7 @@ class AudioAnalysisService:
         """
         if level is not None:
             return level > self.get_current_threshold()
-        return self._last_is_speech
+        return bool(self._state[_ST_LAST_IS_SPEECH])
     
     def is_calibrating(self) -> bool:
         """
@@ -329,6 +733,20 @@ class AudioAnalysisService:
             config: New configuration options (partial)
         """
         self._config.update(config)
+        self._apply_config()
+        
+        # Resize the sample history if its limit changed
+        if not self._is_calibrating and len(self._samples) != self._max_hist:
+            self._resize_history(self._max_hist)
+    
+    def _apply_config(self) -> None:
+        """Copy the per-sample configuration values into attributes."""
+        self._smoothing = float(self._config['smoothing_factor'])
+        self._min_frames = int(self._config['consecutive_frames_threshold'])
+        self._max_hist = int(self._config['max_sample_history'])
+        self._recal_interval = int(self._config['recalibration_interval_ms'])
+        self._silence_for_recal = int(self._config['silence_duration_for_recal_ms'])
+        self._calib_ms = int(self._config['calibration_duration_ms'])
     
     def add_event_listener(self, event: str, callback: Callable) -> None:
         """
@@ -339,7 +757,7 @@ class AudioAnalysisService:
             callback: Function to call when event occurs
         """
         if event in self._event_listeners:
-            self._event_listeners[event].append(callback)
+            self._event_listeners[event] += (callback,)
     
     def remove_event_listener(self, event: str, callback: Callable) -> None:
         """
@@ -350,7 +768,9 @@ class AudioAnalysisService:
             callback: Function to remove
         """
         if event in self._event_listeners and callback in self._event_listeners[event]:
-            self._event_listeners[event].remove(callback)
+            listeners = list(self._event_listeners[event])
+            listeners.remove(callback)
+            self._event_listeners[event] = tuple(listeners)
     
     def _emit_event(self, event: str, data=None) -> None:
         """
@@ -360,9 +780,8 @@ class AudioAnalysisService:
             event: Event type to emit
             data: Data to pass to listeners
         """
-        if event in self._event_listeners:
-            for callback in self._event_listeners[event]:
-                callback(data)
+        for callback in self._event_listeners.get(event, ()):
+            callback(data)
     
     def get_debug_state(self) -> Optional[Dict[str, Any]]:
         """
@@ -375,37 +794,51 @@ class AudioAnalysisService:
         if not self._config['debug']:
             return None
             
+        state = self._state
         return {
             'config': self._config.copy(),
-            'samples': self._samples.copy(),
-            'noise_floor': self._noise_floor,
-            'std_dev': self._std_dev,
-            'sensitivity_factor': self._sensitivity_factor,
+            'samples': self._view_last(len(self._samples)).tolist(),
+            'noise_floor': float(state[_ST_NOISE_FLOOR]),
+            'std_dev': float(state[_ST_STD_DEV]),
+            'sensitivity_factor': float(state[_ST_SENSITIVITY]),
             'threshold': self.get_current_threshold(),
-            'is_speech': self._last_is_speech,
-            'consecutive_speech_frames': self._consecutive_speech_frames,
-            'consecutive_silence_frames': self._consecutive_silence_frames,
+            'is_speech': self.is_speech_detected(),
+            'consecutive_speech_frames': int(state[_ST_SPEECH_FRAMES]),
+            'consecutive_silence_frames': int(state[_ST_SILENCE_FRAMES]),
             'calibration_complete': self._calibration_complete,
             'is_calibrating': self._is_calibrating
         }
 
-# Create a singleton instance
-audio_analysis_service = AudioAnalysisService()
+# Shared instance, created on first use
+_audio_analysis_service: Optional[AudioAnalysisService] = None
+
+def get_audio_analysis_service() -> AudioAnalysisService:
+    """
+    Get the shared AudioAnalysisService, creating it on first use.
+    
+    Returns:
+        The shared service instance
+    """
+    global _audio_analysis_service
+    if _audio_analysis_service is None:
+        _audio_analysis_service = AudioAnalysisService()
+    return _audio_analysis_service
 
 # Helper functions for common calculations
 
-def calculate_rms(samples: List[float]) -> float:
+def calculate_rms(samples: Union[List[float], np.ndarray]) -> float:
     """
     Calculate Root Mean Square (RMS) of audio samples.
     
     Args:
-        samples: List of audio samples
+        samples: List or array of audio samples
     
     Returns:
         RMS value
     """
-    if not samples:
+    arr = np.asarray(samples, dtype=np.float64).ravel()
+    if arr.size == 0:
         return 0.0
-        
-    sum_of_squares = sum(x*x for x in samples)
-    return math.sqrt(sum_of_squares / len(samples)) 
\ No newline at end of file
+    
+    # dot() sums the squares in one vectorized pass without a temporary
+    return math.sqrt(float(np.dot(arr, arr)) / arr.size)
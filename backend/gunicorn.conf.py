@@ -0,0 +1,24 @@
+"""Gunicorn configuration for the Stoic Mentor backend.
+
+Usage: gunicorn -c gunicorn.conf.py api:app
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:5001")
+
+# Socket.IO sessions and VAD state live in process memory, so a single
+# worker serves every client; gevent gives it concurrency across greenlets
+# (including the blocking OpenAI calls).
+workers = 1
+worker_class = "geventwebsocket.gunicorn.workers.GeventWebSocketWorker"
+worker_connections = 1000
+
+# Keep idle HTTP connections open between polls, and allow for slow
+# GPT/TTS upstream calls before a worker is considered stuck
+keepalive = 75
+timeout = 120
+graceful_timeout = 30
+
+loglevel = os.getenv("LOG_LEVEL", "warning").lower()
+accesslog = None
+errorlog = "-"
@@ -16,6 +16,11 @@ from typing import Dict, Any, Optional, List, Tuple
 from audio_analysis_service import AudioAnalysisService, AudioAnalysisEvent
 from dataclasses import dataclass
 
+try:
+    from numba import njit
+except ImportError:  # Numba is optional, the NumPy kernel below is used instead
+    njit = None
+
 # Default configuration
 DEFAULT_SOCKET_VAD_CONFIG = {
     'sample_rate': 16000,  # WebRTC VAD requires 8000, 16000, 32000, or 48000 Hz
@@ -30,10 +35,53 @@ DEFAULT_SOCKET_VAD_CONFIG = {
     'debug': False
 }
 
+def _frame_rms_numpy(pcm: np.ndarray, frame_samples: int) -> np.ndarray:
+    """
+    Calculate the normalized RMS level of every complete frame in a PCM buffer.
+    
+    Args:
+        pcm: 16-bit PCM samples
+        frame_samples: Number of samples per frame
+        
+    Returns:
+        Array with one RMS level (0-1 range) per frame
+    """
+    n_frames = len(pcm) // frame_samples
+    # Squares of int16 samples are summed exactly in int64, with a single
+    # float conversion per frame
+    frames = pcm[:n_frames * frame_samples].reshape(n_frames, frame_samples).astype(np.int64)
+    return np.sqrt(np.einsum('ij,ij->i', frames, frames) / frame_samples) / 32768.0
+
+def _frame_rms_loop(pcm: np.ndarray, frame_samples: int) -> np.ndarray:
+    """Loop form of _frame_rms_numpy, compiled with Numba when it is available."""
+    n_frames = len(pcm) // frame_samples
+    levels = np.empty(n_frames, dtype=np.float64)
+    for f in range(n_frames):
+        start = f * frame_samples
+        # Squares of int16 samples are summed exactly in an integer
+        # accumulator, with a single float conversion per frame
+        sum_of_squares = 0
+        for i in range(start, start + frame_samples):
+            sample = np.int64(pcm[i])
+            sum_of_squares += sample * sample
+        levels[f] = np.sqrt(sum_of_squares / frame_samples) / 32768.0
+    return levels
+
+if njit is not None:
+    frame_rms = njit(cache=True, fastmath=True)(_frame_rms_loop)
+    # Compile at import so the first audio chunk does not pay for it
+    frame_rms(np.zeros(1, dtype=np.int16), 1)
+else:
+    frame_rms = _frame_rms_numpy
+
+# Bits of the per-frame speech flags kept in the session frame history
+FRAME_SPEECH_RMS = 1
+FRAME_SPEECH_WEBRTC = 2
+FRAME_SPEECH_ENSEMBLE = 4
+
 @dataclass
 class AudioFrame:
-    """Represents a frame of audio data for processing."""
-    data: bytes
+    """Represents a processed frame of audio in a session's history."""
     rms_level: float
     timestamp: int
     is_speech_rms: bool = False
@@ -57,6 +105,8 @@ class UserSession:
         self.config = DEFAULT_SOCKET_VAD_CONFIG.copy()
         if config:
             self.config.update(config)
+        self._session_timeout_ms = self.config['session_timeout_ms']
+        self._update_ensemble_table()
         
         # Audio analysis service for RMS-based VAD
         self.audio_service = AudioAnalysisService({
@@ -72,8 +122,14 @@ class UserSession:
         self.is_speaking = False
         self.speech_start_time = 0
         self.speech_end_time = 0
-        self.frames: List[AudioFrame] = []
+        
+        # Frame history as parallel ring buffers, one slot per frame
         self.max_frames = 100  # Keep last 100 frames for analysis
+        self._frame_levels = np.zeros(self.max_frames, dtype=np.float64)
+        self._frame_timestamps = np.zeros(self.max_frames, dtype=np.int64)
+        self._frame_flags = np.zeros(self.max_frames, dtype=np.uint8)
+        self._frame_write = 0
+        self._frame_count = 0
         
         # Debug stats
         self.total_frames = 0
@@ -89,49 +145,110 @@ class UserSession:
             print(f"[UserSession] Created new session {session_id}")
             print(f"[UserSession] Frame size: {self.frame_size} bytes")
     
-    def is_expired(self) -> bool:
-        """Check if this session has expired based on inactivity."""
-        now = int(time.time() * 1000)
-        return (now - self.last_activity) > self.config['session_timeout_ms']
+    @property
+    def frames(self) -> List[AudioFrame]:
+        """The stored frame history, oldest first."""
+        order = np.arange(self._frame_write - self._frame_count, self._frame_write) % self.max_frames
+        return [
+            AudioFrame(
+                rms_level=level,
+                timestamp=timestamp,
+                is_speech_rms=bool(flags & FRAME_SPEECH_RMS),
+                is_speech_webrtc=bool(flags & FRAME_SPEECH_WEBRTC),
+                is_speech_ensemble=bool(flags & FRAME_SPEECH_ENSEMBLE)
+            )
+            for level, timestamp, flags in zip(
+                self._frame_levels[order].tolist(),
+                self._frame_timestamps[order].tolist(),
+                self._frame_flags[order].tolist()
+            )
+        ]
     
-    def update_activity(self) -> None:
-        """Update the last activity timestamp."""
-        self.last_activity = int(time.time() * 1000)
+    def _update_ensemble_table(self) -> None:
+        """
+        Precompute the ensemble decision for every combination of RMS and
+        WebRTC results, indexed by their FRAME_SPEECH_* flags.
+        """
+        table = []
+        for flags in range((FRAME_SPEECH_RMS | FRAME_SPEECH_WEBRTC) + 1):
+            is_speech_rms = bool(flags & FRAME_SPEECH_RMS)
+            is_speech_webrtc = bool(flags & FRAME_SPEECH_WEBRTC)
+            if self.config['use_webrtc_vad'] and self.config['use_rms_vad']:
+                ensemble_score = (
+                    (is_speech_webrtc * self.config['webrtc_weight']) + 
+                    (is_speech_rms * self.config['rms_weight'])
+                )
+                table.append(ensemble_score > 0.5)
+            else:
+                # Use whichever method is enabled
+                table.append(is_speech_rms if self.config['use_rms_vad'] else is_speech_webrtc)
+        self._ensemble_table = tuple(table)
+    
+    def is_expired(self, now: Optional[int] = None) -> bool:
+        """Check if this session has expired based on inactivity, as of now (ms) if given."""
+        if now is None:
+            now = int(time.time() * 1000)
+        return (now - self.last_activity) > self._session_timeout_ms
+    
+    def update_activity(self, now: Optional[int] = None) -> None:
+        """Update the last activity timestamp, to now (ms) if given."""
+        self.last_activity = int(time.time() * 1000) if now is None else now
     
     def process_audio_chunk(self, audio_data: bytes) -> Dict[str, Any]:
         """
         Process an incoming audio chunk and determine VAD status.
         
         Args:
-            audio_data: Base64-encoded PCM audio data
+            audio_data: Raw PCM bytes from a binary Socket.IO frame,
+                or base64-encoded PCM audio data
             
         Returns:
             Dictionary with VAD results
         """
-        self.update_activity()
         timestamp = int(time.time() * 1000)
+        self.update_activity(timestamp)
+        
+        # Binary frames arrive as bytes and need no decoding
+        if isinstance(audio_data, (bytes, bytearray, memoryview)):
+            decoded_audio = audio_data
+        else:
+            # Decode base64 audio data
+            try:
+                decoded_audio = base64.b64decode(audio_data)
+            except Exception as e:
+                if self.config['debug']:
+                    print(f"[UserSession] Error decoding audio: {e}")
+                return {"error": "Invalid audio data format"}
         
-        # Decode base64 audio data
-        try:
-            decoded_audio = base64.b64decode(audio_data)
-        except Exception as e:
-            if self.config['debug']:
-                print(f"[UserSession] Error decoding audio: {e}")
-            return {"error": "Invalid audio data format"}
+        # Frames are handed to WebRTC VAD as zero-copy slices of one view
+        audio_view = memoryview(decoded_audio).cast('B')
         
-        # Process the audio frame by frame
-        results = []
-        for i in range(0, len(decoded_audio), self.frame_size):
-            if i + self.frame_size <= len(decoded_audio):
-                frame_data = decoded_audio[i:i+self.frame_size]
-                result = self._process_frame(frame_data, timestamp)
-                results.append(result)
+        # Calculate the RMS level of every complete frame in one pass
+        frame_samples = self.frame_size // 2
+        n_frames = len(audio_view) // self.frame_size
+        pcm_data = np.frombuffer(audio_view, dtype=np.int16, count=n_frames * frame_samples)
+        rms_levels = frame_rms(pcm_data, frame_samples)
+        
+        # Run the RMS analysis over all frames in one call, unless RMS VAD is
+        # disabled and the ensemble would ignore its decisions anyway
+        if self.config['use_rms_vad']:
+            rms_result = self.audio_service.add_audio_samples(
+                rms_levels, np.full(n_frames, timestamp, dtype=np.int64)
+            )
+            is_speech_rms = rms_result['is_speech'].tolist()
+        else:
+            is_speech_rms = [False] * n_frames
+        
+        # Process the audio frame by frame, counting speech frames
+        speech_frames = 0
+        for i, rms_level in enumerate(rms_levels.tolist()):
+            frame_data = audio_view[i * self.frame_size:(i + 1) * self.frame_size]
+            if self._process_frame(frame_data, rms_level, is_speech_rms[i], timestamp):
+                speech_frames += 1
         
         # Determine overall speech state from the frame results
-        if results:
-            # Count speech frames
-            speech_frames = sum(1 for r in results if r['is_speech'])
-            speech_ratio = speech_frames / len(results)
+        if n_frames:
+            speech_ratio = speech_frames / n_frames
             
             new_is_speaking = speech_ratio > 0.5  # More than half of frames have speech
             
@@ -163,27 +280,72 @@ class UserSession:
             "session_id": self.session_id
         }
     
-    def _process_frame(self, frame_data: bytes, timestamp: int) -> Dict[str, Any]:
+    def process_level_batch(self, levels: np.ndarray,
+                            timestamps: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """
+        Process a batch of precomputed audio levels in one call.
+
+        Args:
+            levels: Array of RMS audio levels (0-1 range)
+            timestamps: Optional array of timestamps in ms, one per level
+
+        Returns:
+            Dictionary with VAD results, holding one array entry per level
+        """
+        now = int(time.time() * 1000)
+        self.update_activity(now)
+
+        if timestamps is None:
+            timestamps = np.full(len(levels), now, dtype=np.int64)
+
+        # Run the adaptive threshold over the whole batch in one call
+        rms_result = self.audio_service.add_audio_samples(levels, timestamps)
+        thresholds = rms_result['thresholds'].astype(np.float32)
+        is_speech = rms_result['is_speech']
+
+        self.total_frames += len(levels)
+        self.speech_frames += int(np.count_nonzero(is_speech))
+
+        result = {
+            "event": "vad_result",
+            "timestamp": now,
+            "levels": levels.tolist(),
+            "thresholds": thresholds.tolist(),
+            "is_speech": is_speech.tolist(),
+            "session_id": self.session_id
+        }
+
+        # The last confirmed state of the batch decides speech transitions
+        new_is_speaking = bool(is_speech[-1]) if len(is_speech) else self.is_speaking
+        if new_is_speaking and not self.is_speaking:
+            self.is_speaking = True
+            self.speech_start_time = now
+            result["event"] = "speech_start"
+        elif not new_is_speaking and self.is_speaking:
+            self.is_speaking = False
+            self.speech_end_time = now
+            result["event"] = "speech_end"
+            result["duration_ms"] = self.speech_end_time - self.speech_start_time
+
+        result["is_speaking"] = self.is_speaking
+        return result
+
+    def _process_frame(self, frame_data: memoryview, rms_level: float,
+                       is_speech_rms: bool, timestamp: int) -> bool:
         """
         Process a single frame of audio.
         
         Args:
             frame_data: PCM audio data for a single frame
+            rms_level: Normalized RMS level of the frame (0-1)
+            is_speech_rms: Speech state from the AudioAnalysisService (RMS-based)
             timestamp: Current timestamp in milliseconds
             
         Returns:
-            Frame processing results
+            Whether the ensemble detected speech in the frame
         """
         self.total_frames += 1
         
-        # Calculate RMS level for this frame
-        pcm_data = np.frombuffer(frame_data, dtype=np.int16)
-        rms_level = np.sqrt(np.mean(pcm_data.astype(np.float32) ** 2)) / 32768.0  # Normalize to 0-1
-        
-        # Process with AudioAnalysisService (RMS-based)
-        rms_result = self.audio_service.add_audio_sample(rms_level, timestamp)
-        is_speech_rms = rms_result['is_speech']
-        
         # Process with WebRTC VAD if enabled
         is_speech_webrtc = False
         if self.webrtc_vad and len(frame_data) == self.frame_size:
@@ -193,47 +355,28 @@ class UserSession:
                 if self.config['debug']:
                     print(f"[UserSession] WebRTC VAD error: {e}")
         
-        # Combine results if using both methods
-        is_speech_ensemble = False
-        if self.config['use_webrtc_vad'] and self.config['use_rms_vad']:
-            ensemble_score = (
-                (is_speech_webrtc * self.config['webrtc_weight']) + 
-                (is_speech_rms * self.config['rms_weight'])
-            )
-            is_speech_ensemble = ensemble_score > 0.5
-        else:
-            # Use whichever method is enabled
-            is_speech_ensemble = is_speech_rms if self.config['use_rms_vad'] else is_speech_webrtc
+        # Combine results using the precomputed ensemble decisions
+        flags = (FRAME_SPEECH_RMS if is_speech_rms else 0) | (FRAME_SPEECH_WEBRTC if is_speech_webrtc else 0)
+        is_speech_ensemble = self._ensemble_table[flags]
         
-        # Create frame record
-        frame = AudioFrame(
-            data=frame_data,
-            rms_level=rms_level,
-            timestamp=timestamp,
-            is_speech_rms=is_speech_rms,
-            is_speech_webrtc=is_speech_webrtc,
-            is_speech_ensemble=is_speech_ensemble
-        )
-        
-        # Store frame in history
-        self.frames.append(frame)
-        if len(self.frames) > self.max_frames:
-            self.frames.pop(0)  # Remove oldest frame
+        # Store frame in history, overwriting the oldest frame when full
+        slot = self._frame_write
+        self._frame_levels[slot] = rms_level
+        self._frame_timestamps[slot] = timestamp
+        self._frame_flags[slot] = flags | (FRAME_SPEECH_ENSEMBLE if is_speech_ensemble else 0)
+        self._frame_write = (slot + 1) % self.max_frames
+        if self._frame_count < self.max_frames:
+            self._frame_count += 1
         
         # Update statistics
         if is_speech_ensemble:
             self.speech_frames += 1
         
-        return {
-            "is_speech": is_speech_ensemble,
-            "rms_level": rms_level,
-            "threshold": rms_result['threshold'],
-            "timestamp": timestamp
-        }
+        return is_speech_ensemble
     
-    def get_noise_profile(self) -> Dict[str, Any]:
+    def get_noise_profile(self, include_samples: bool = False) -> Dict[str, Any]:
         """Get the current audio noise profile from the RMS analysis."""
-        return self.audio_service.get_noise_profile()
+        return self.audio_service.get_noise_profile(include_samples)
     
     def force_recalibration(self) -> None:
         """Force recalibration of the audio analysis."""
@@ -249,6 +392,8 @@ class UserSession:
             }
             
             self.config.update(config)
+            self._session_timeout_ms = self.config['session_timeout_ms']
+            self._update_ensemble_table()
             
             # Check if WebRTC VAD settings changed
             if (self.config['use_webrtc_vad'] != prev_webrtc_config['use_webrtc_vad'] or
@@ -305,8 +450,10 @@ class SocketVADService:
         if config:
             self.config.update(config)
         
-        # User sessions dictionary keyed by session ID
+        # User sessions dictionary keyed by session ID. The lock covers the
+        # check-then-modify steps shared with the cleanup thread.
         self.sessions: Dict[str, UserSession] = {}
+        self._sessions_lock = threading.Lock()
         
         # Session cleanup thread
         self.cleanup_thread = threading.Thread(target=self._cleanup_expired_sessions)
@@ -331,46 +478,31 @@ class SocketVADService:
             session_id = str(uuid.uuid4())
         
         # Create new session if it doesn't exist
-        if session_id not in self.sessions:
-            self.sessions[session_id] = UserSession(session_id, self.config)
-            
-        return session_id, self.sessions[session_id]
-    
-    def process_audio(self, session_id: str, audio_data: bytes) -> Dict[str, Any]:
-        """
-        Process audio data for a specific session.
-        
-        Args:
-            session_id: Session identifier
-            audio_data: Base64-encoded audio data
+        with self._sessions_lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self.sessions[session_id] = UserSession(session_id, self.config)
             
-        Returns:
-            Processing result
-        """
-        # Get or create session
-        _, session = self.get_or_create_session(session_id)
-        
-        # Process the audio
-        return session.process_audio_chunk(audio_data)
+        return session_id, session
     
     def _cleanup_expired_sessions(self) -> None:
         """Background thread to clean up expired sessions."""
         while True:
             try:
-                # Find expired sessions
+                # Find and remove expired sessions
                 now = int(time.time() * 1000)
-                expired_sessions = [
-                    sid for sid, session in self.sessions.items()
-                    if session.is_expired()
-                ]
+                with self._sessions_lock:
+                    expired_sessions = [
+                        (sid, session) for sid, session in self.sessions.items()
+                        if session.is_expired(now)
+                    ]
+                    for sid, _ in expired_sessions:
+                        del self.sessions[sid]
                 
-                # Remove expired sessions
-                for sid in expired_sessions:
-                    if self.config['debug']:
-                        session = self.sessions[sid]
+                if self.config['debug']:
+                    for sid, session in expired_sessions:
                         print(f"[SocketVADService] Removing expired session {sid} "
                               f"(inactive for {now - session.last_activity}ms)")
-                    del self.sessions[sid]
                 
                 # Sleep for a while
                 time.sleep(60)  # Check every minute
@@ -394,10 +526,8 @@ class SocketVADService:
         Returns:
             True if session was removed, False if not found
         """
-        if session_id in self.sessions:
-            del self.sessions[session_id]
-            return True
-        return False
+        with self._sessions_lock:
+            return self.sessions.pop(session_id, None) is not None
 
 # Create global instance
 socket_vad_service = SocketVADService() 
\ No newline at end of file
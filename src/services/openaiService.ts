@@ -253,6 +253,34 @@ export function useDirectOpenAI(): boolean {
   return useDirectApi;
 }
 
+// Acknowledgment phrases that should not open a mentor response
+const ACKNOWLEDGMENT_PHRASES = [
+  "I understand what you're saying",
+  'I understand what you are saying',
+  "I see what you're saying",
+  'I see what you are saying',
+  'I understand your question',
+  'Let me think about that',
+  'I appreciate your question',
+  'Thank you for your question',
+  'As a Stoic philosopher',
+  'From a Stoic perspective',
+  'Looking at this from a Stoic perspective',
+  'Speaking as a Stoic',
+  "I understand you're asking",
+  'I understand you are asking',
+  'I am here',
+  'Yes, I am here',
+  'Indeed I am',
+  'Present and attentive',
+  'Present and listening',
+  'Yes, at your service',
+  'Indeed\\.',
+];
+
+// All phrases compiled once into a single anchored alternation
+const ACKNOWLEDGMENT_PATTERN = new RegExp(`^(?:${ACKNOWLEDGMENT_PHRASES.join('|')})`, 'i');
+
 /**
  * Sanitizes a response to remove acknowledgment phrases
  * 
@@ -260,62 +288,25 @@ export function useDirectOpenAI(): boolean {
  * @returns The sanitized text
  */
 export function sanitizeResponse(text: string): string {
-  console.log(`🧹 SANITIZE - Starting with text: "${text.substring(0, 100)}..."`);
-  
-  // List of acknowledgment phrases to check for and remove
-  const acknowledgmentPhrases = [
-    /^I understand what you're saying/i,
-    /^I understand what you are saying/i,
-    /^I see what you're saying/i,
-    /^I see what you are saying/i,
-    /^I understand your question/i,
-    /^Let me think about that/i,
-    /^I appreciate your question/i,
-    /^Thank you for your question/i,
-    /^As a Stoic philosopher/i,
-    /^From a Stoic perspective/i,
-    /^Looking at this from a Stoic perspective/i,
-    /^Speaking as a Stoic/i,
-    /^I understand you're asking/i,
-    /^I understand you are asking/i,
-    /^I am here/i,
-    /^Yes, I am here/i,
-    /^Indeed I am/i,
-    /^Present and attentive/i,
-    /^Present and listening/i,
-    /^Yes, at your service/i,
-    /^Indeed\./i,
-  ];
-  
   let sanitized = text;
   let wasModified = false;
   
-  // Check each phrase against the text
-  for (const phrase of acknowledgmentPhrases) {
-    if (phrase.test(sanitized)) {
-      console.log(`🧹 SANITIZE - Found acknowledgment phrase matching: ${phrase}`);
-      
-      // Find the first sentence ending after the acknowledgment phrase
-      const phraseMatch = sanitized.match(phrase);
-      if (phraseMatch && phraseMatch.index !== undefined) {
-        const startIndex = phraseMatch.index;
-        // Find the end of the first sentence
-        const endIndex = sanitized.indexOf('.', startIndex);
-        
-        if (endIndex !== -1) {
-          // Remove the entire first sentence containing the acknowledgment
-          sanitized = sanitized.substring(endIndex + 1).trim();
-          wasModified = true;
-        }
-      }
+  // Remove opening sentences for as long as they start with an acknowledgment
+  while (ACKNOWLEDGMENT_PATTERN.test(sanitized)) {
+    // Find the end of the first sentence
+    const endIndex = sanitized.indexOf('.');
+    if (endIndex === -1) {
+      break;
     }
+    
+    // Remove the entire first sentence containing the acknowledgment
+    sanitized = sanitized.substring(endIndex + 1).trim();
+    wasModified = true;
   }
   
   if (wasModified) {
     console.log(`🧹 SANITIZE - Response was modified!`);
     console.log(`🧹 SANITIZE - Sanitized text: "${sanitized.substring(0, 100)}..."`);
-  } else {
-    console.log(`🧹 SANITIZE - No acknowledgment phrases found`);
   }
   
   return sanitized;
@@ -252,9 +252,9 @@ class SocketVadService {
 
   /**
    * Process an audio chunk
-   * @param audioData Base64-encoded PCM audio data
+   * @param audioData 16-bit PCM audio data, sent as a binary frame, or base64-encoded PCM
    */
-  processAudio(audioData: string): void {
+  processAudio(audioData: ArrayBuffer | string): void {
     if (!this.socket || !this.isConnected || !this.sessionId) {
       console.error('[SocketVAD] Cannot process audio: not connected or no session');
       return;
@@ -318,11 +318,8 @@ class SocketVadService {
     // Convert to the format expected by the backend
     const pcmData = this.convertAudioBufferToPCM(audioBuffer);
     
-    // Encode as base64
-    const base64Data = btoa(String.fromCharCode(...new Uint8Array(pcmData)));
-    
-    // Send to the server
-    this.processAudio(base64Data);
+    // Send to the server as a binary frame
+    this.processAudio(pcmData);
   }
 
   /**
@@ -333,11 +330,8 @@ class SocketVadService {
     // Convert to the format expected by the backend
     const pcmData = this.convertFloat32ToPCM(audioData);
     
-    // Encode as base64
-    const base64Data = btoa(String.fromCharCode(...new Uint8Array(pcmData)));
-    
-    // Send to the server
-    this.processAudio(base64Data);
+    // Send to the server as a binary frame
+    this.processAudio(pcmData);
   }
 
   /**
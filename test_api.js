@@ -1,47 +1,53 @@
 // Test script for API endpoints
 const baseUrl = 'http://localhost:5002';
 
-async function testEndpoints() {
-  console.log('Testing API endpoints...');
-  
-  // Test health endpoint
-  try {
-    console.log('Testing /api/health...');
-    const healthResponse = await fetch(`${baseUrl}/api/health`);
-    const healthData = await healthResponse.json();
-    console.log('Health response:', healthData);
-  } catch (error) {
-    console.error('Health endpoint failed:', error);
-  }
-  
-  // Test test endpoint
+// Fetch an endpoint and parse its JSON body, capturing any error
+async function fetchJson(path, options) {
   try {
-    console.log('Testing /api/test...');
-    const testResponse = await fetch(`${baseUrl}/api/test`);
-    const testData = await testResponse.json();
-    console.log('Test response:', testData);
+    const response = await fetch(`${baseUrl}${path}`, options);
+    return { data: await response.json() };
   } catch (error) {
-    console.error('Test endpoint failed:', error);
+    return { error };
   }
+}
+
+async function testEndpoints() {
+  console.log('Testing API endpoints...');
   
-  // Test gpt endpoint with a POST request
-  try {
-    console.log('Testing /api/gpt...');
-    const gptResponse = await fetch(`${baseUrl}/api/gpt`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
+  // The endpoints are independent, so request them all at once and
+  // report the results in order
+  const tests = [
+    { name: 'Health', path: '/api/health' },
+    { name: 'Test', path: '/api/test' },
+    {
+      name: 'GPT',
+      path: '/api/gpt',
+      options: {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+          text: 'What does it mean to live virtuously according to the Stoics?',
+          mentor: 'Marcus',
+        }),
       },
-      body: JSON.stringify({
-        text: 'What does it mean to live virtuously according to the Stoics?',
-        mentor: 'Marcus',
-      }),
-    });
-    const gptData = await gptResponse.json();
-    console.log('GPT response:', gptData);
-  } catch (error) {
-    console.error('GPT endpoint failed:', error);
+    },
+  ];
+  
+  for (const { path } of tests) {
+    console.log(`Testing ${path}...`);
   }
+  const results = await Promise.all(tests.map(({ path, options }) => fetchJson(path, options)));
+  
+  results.forEach(({ data, error }, i) => {
+    const { name } = tests[i];
+    if (error) {
+      console.error(`${name} endpoint failed:`, error);
+    } else {
+      console.log(`${name} response:`, data);
+    }
+  });
 }
 
 // Run the tests